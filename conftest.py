@@ -0,0 +1,18 @@
+from django.test import override_settings
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_background_workers():
+    """Image jobs run inline, no thread outlives a test and its database."""
+    with override_settings(THUMBNAIL_WORKERS=0):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def private_cache():
+    """A private L2 cache, the shared one belongs to the dev server."""
+    from core.testing import TEST_CACHES
+
+    with override_settings(CACHES=TEST_CACHES):
+        yield
@@ -1,11 +1,13 @@
 from http import HTTPStatus
-from django.test import TestCase, Client
+
+from core.query_budget import BudgetClient
+from core.testing import TestCase
 
 
 class StaticURLTests(TestCase):
     def setUp(self):
         # имитация браузера
-        self.guest_client = Client()
+        self.guest_client = BudgetClient()
 
     def test_about_author(self):
         """Checking url /about/author/."""
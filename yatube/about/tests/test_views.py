@@ -1,11 +1,12 @@
-from django.test import TestCase
-from django.test.client import Client
 from django.urls import reverse
 
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+
 
 class TestStaticViews(TestCase):
     def setUp(self):
-        self.client = Client()
+        self.client = BudgetClient()
 
     def test_about_author(self):
         """Checking the view about:author."""
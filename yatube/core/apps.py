@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+
+        from . import db_connections, profiling
+
+        connection_created.connect(db_connections.connection_opened)
+        request_started.connect(db_connections.check_connections)
+        profiling.install()
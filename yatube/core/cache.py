@@ -0,0 +1,190 @@
+"""Two-tier cache: a small in-process LRU in front of a shared cache.
+
+L2 is any configured cache alias shared by all workers (files on one host,
+Redis or Memcached in production), L1 keeps the hottest entries of this
+process for at most L1_TIMEOUT seconds. Writes go to both tiers, so this
+process sees its own changes at once and others within L1_TIMEOUT.
+Mutable keys that must be seen by every worker immediately - cache
+versions, counters - are listed in L1_EXCLUDE and always read from L2;
+everything stored under such a version is immutable and safe in L1,
+bumping the version is the broadcast invalidation.
+
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {'L2': 'shared', 'MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5,
+                    'L1_EXCLUDE': ('posts:feed_version',)},
+    }
+"""
+import copy
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+# L1 одна на процесс: общая для потоков, как у LocMemCache
+_stores = {}
+_locks = {}
+
+
+class TieredCache(BaseCache):
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options['L2']
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._l1_exclude = tuple(options.get('L1_EXCLUDE', ()))
+        self._l1 = _stores.setdefault(name, OrderedDict())
+        self._lock = _locks.setdefault(name, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_key(self, key, version):
+        if key.startswith(self._l1_exclude):
+            return None
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _l1_get(self, l1_key):
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is None:
+                return _MISSING
+            expires, pickled = entry
+            if expires < time.monotonic():
+                del self._l1[l1_key]
+                return _MISSING
+            self._l1.move_to_end(l1_key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, l1_key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        ttl = (self._l1_timeout if timeout is None
+               else min(timeout, self._l1_timeout))
+        if ttl <= 0:
+            self._l1_delete(l1_key)
+            return
+        # храним pickle, чтобы правка полученного объекта не меняла L1
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[l1_key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, l1_key):
+        with self._lock:
+            self._l1.pop(l1_key, None)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            value = self._l1_get(l1_key)
+            if value is not _MISSING:
+                return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        if l1_key is not None:
+            self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            l1_key = self._l1_key(key, version)
+            value = (_MISSING if l1_key is None
+                     else self._l1_get(l1_key))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            for key, value in from_l2.items():
+                l1_key = self._l1_key(key, version)
+                if l1_key is not None:
+                    self._l1_set(l1_key, value)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self._l1_set(l1_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version) or []
+        for key, value in data.items():
+            l1_key = self._l1_key(key, version)
+            if l1_key is not None and key not in failed:
+                self._l1_set(l1_key, value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        l1_key = self._l1_key(key, version)
+        if added and l1_key is not None:
+            self._l1_set(l1_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self._l1_delete(l1_key)
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            l1_key = self._l1_key(key, version)
+            if l1_key is not None:
+                self._l1_delete(l1_key)
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None and self._l1_get(l1_key) is not _MISSING:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # атомарность обеспечивает L2, копию в L1 просто сбрасываем
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self._l1_delete(l1_key)
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+def private_caches(location):
+    """CACHES with the same tiers but a private in-memory L2.
+
+    The alias names stay, so objects holding the default cache (sorl's
+    key-value store) resolve the private L2 too.
+    """
+    caches_setting = copy.deepcopy(settings.CACHES)
+    l2_alias = caches_setting['default'].get('OPTIONS', {}).get('L2')
+    private = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+               'LOCATION': location}
+    caches_setting[l2_alias or 'default'] = private
+    return caches_setting
@@ -0,0 +1,51 @@
+"""Persistent database connections: health checks and usage counters.
+
+With CONN_MAX_AGE every worker thread keeps its connection between
+requests, so the thread's connection is its pool. Django pings a kept
+connection only after an error; with DB_HEALTH_CHECKS the connections
+are checked before every request and broken ones are dropped, the next
+query reconnects. Opened, reused and dropped connections are counted per
+alias for the monitoring view.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+EVENTS = ('opened', 'reused', 'dropped')
+
+_lock = threading.Lock()
+_events = Counter()
+
+
+def _count(alias, event):
+    with _lock:
+        _events[alias, event] += 1
+
+
+def connection_opened(sender, connection, **kwargs):
+    """connection_created: a new connection to the database was made."""
+    _count(connection.alias, 'opened')
+
+
+def check_connections(**kwargs):
+    """request_started: counts kept connections, drops the broken ones."""
+    for conn in connections.all():
+        # в транзакции (тесты) соединение трогать нельзя
+        if conn.connection is None or conn.in_atomic_block:
+            continue
+        if not settings.DB_HEALTH_CHECKS or conn.is_usable():
+            _count(conn.alias, 'reused')
+        else:
+            conn.close()
+            _count(conn.alias, 'dropped')
+
+
+def stats():
+    """Returns {alias: {event: count}} for every configured database."""
+    with _lock:
+        return {
+            alias: {event: _events[alias, event] for event in EVENTS}
+            for alias in connections
+        }
@@ -0,0 +1,71 @@
+"""Routing reads to replicas and writes to the primary database.
+
+Replicas are listed in settings.DATABASE_REPLICAS, without them every
+query goes to default as before. Reads are pinned to the primary inside
+transactions, in views wrapped with primary_db, after the first write of
+the request and, through ReplicaRoutingMiddleware, for
+REPLICA_STICKY_SECONDS after a write so users read their own writes
+while the replicas catch up.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def reset():
+    """Forgets the pins and writes of the previous request."""
+    _state.__dict__.clear()
+
+
+def has_written():
+    return getattr(_state, 'written', False)
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', 0) > 0 or has_written()
+
+
+@contextmanager
+def use_primary():
+    """Reads inside the block go to the primary database."""
+    _state.pinned = getattr(_state, 'pinned', 0) + 1
+    try:
+        yield
+    finally:
+        _state.pinned -= 1
+
+
+def primary_db(view):
+    """Views that write read from the primary too, never from a replica."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_primary():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or is_pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплики получают схему репликацией, а не миграциями
+        return db == DEFAULT_DB_ALIAS
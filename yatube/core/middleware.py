@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from . import db_routers
+
+
+class ReplicaRoutingMiddleware:
+    """Keeps a user on the primary database for a while after a write."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        db_routers.reset()
+        sticky = settings.REPLICA_STICKY_COOKIE in request.COOKIES
+        try:
+            if sticky:
+                with db_routers.use_primary():
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+            if db_routers.has_written():
+                response.set_cookie(
+                    settings.REPLICA_STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax')
+        finally:
+            db_routers.reset()
+        return response
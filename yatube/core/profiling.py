@@ -0,0 +1,153 @@
+"""Lightweight always-on request profiling.
+
+ProfilingMiddleware measures every request: number of SQL queries and
+their total time (through connection.execute_wrapper), template render
+time, view time and total time. Requests over PROFILING_SLOW_REQUEST_MS or
+PROFILING_MAX_QUERIES are logged together with the statements they ran
+more than once (usually an N+1). The last PROFILING_SAMPLES requests of
+every URL name are kept in memory, percentiles() summarises them for the
+monitoring view. Numbers are per worker process.
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('total_ms', 'view_ms', 'sql_ms', 'template_ms', 'queries')
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = defaultdict(deque)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.sql = Counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: считаем каждый запрос и его время
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql[sql] += 1
+
+    @property
+    def queries(self):
+        return sum(self.sql.values())
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.sql.most_common()
+                if count > 1]
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def install():
+    """Times template rendering, called once from CoreConfig.ready()."""
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _timed_render(Template.render)
+
+
+def record(url_name, sample):
+    with _lock:
+        samples = _samples[url_name]
+        samples.append(sample)
+        while len(samples) > settings.PROFILING_SAMPLES:
+            samples.popleft()
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def _percentile(values, percent):
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
+
+
+def percentiles():
+    """Returns {url_name: {'count': n, metric: {'p50': ...}}}."""
+    with _lock:
+        samples = {name: list(values) for name, values in _samples.items()}
+    result = {}
+    for url_name, values in sorted(samples.items()):
+        stats = {'count': len(values)}
+        for metric in METRICS:
+            ordered = sorted(sample[metric] for sample in values)
+            stats[metric] = {f'p{percent}': _percentile(ordered, percent)
+                             for percent in PERCENTILES}
+        result[url_name] = stats
+    return result
+
+
+class ProfilingMiddleware:
+    """Records timings of every request, logs the slow ones."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        _local.profile = profile
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        finished = time.perf_counter()
+
+        match = request.resolver_match
+        url_name = match.view_name if match else 'unresolved'
+        view_started = profile.view_started or started
+        sample = {
+            'total_ms': round((finished - started) * 1000, 2),
+            'view_ms': round((finished - view_started) * 1000, 2),
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'template_ms': round(profile.template_time * 1000, 2),
+            'queries': profile.queries,
+        }
+        record(url_name, sample)
+        if (sample['total_ms'] > settings.PROFILING_SLOW_REQUEST_MS
+                or sample['queries'] > settings.PROFILING_MAX_QUERIES):
+            logger.warning(
+                'Slow request %s %s (%s): %s, duplicated SQL: %s',
+                request.method, request.get_full_path(), url_name, sample,
+                profile.duplicates()[:5])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(_local, 'profile', None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
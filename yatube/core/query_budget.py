@@ -0,0 +1,85 @@
+"""Query budgets for tests.
+
+query_budget() fails when the wrapped block (or decorated test) runs more
+SQL statements than allowed or repeats the very same statement too often.
+BudgetClient is a test client that applies the budget from BUDGETS to
+every request by its URL name, redirects included, so view tests catch a
+new N+1 without asserting on queries themselves.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+
+# URL name: (запросов, повторов одного и того же запроса). Бюджет - худший
+# случай из тестов: авторизованный клиент (сессия + пользователь) и первое
+# обращение к счетчику, который еще надо завести (+5).
+BUDGETS = {
+    'about:author': (2, 0),
+    'about:tech': (2, 0),
+    'admin:posts_post_changelist': (7, 1),
+    # + пачка комментариев, которую пишет заполнивший ее запрос
+    'posts:add_comment': (6, 0),
+    'posts:comments_batch': (2, 0),
+    'posts:follow_index': (4, 0),
+    'posts:group_list': (9, 0),
+    'posts:index': (6, 0),
+    'posts:post_create': (13, 0),
+    'posts:post_detail': (7, 0),
+    'posts:post_edit': (12, 1),
+    # шапка профиля - один запрос; is_followed берется из множества
+    # подписок читателя (posts.adjacency), холодный кэш - еще один запрос
+    'posts:profile': (6, 0),
+    # INSERT/DELETE подписки, лента и два UPSERT счетчиков в транзакции,
+    # AJAX еще читает число подписчиков
+    'posts:profile_follow': (11, 0),
+    'posts:profile_unfollow': (10, 0),
+    'posts:search': (3, 0),
+    'users:login': (2, 0),
+    'users:signup': (2, 0),
+    # 404: сессия и пользователь для шапки
+    None: (2, 0),
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(queries, duplicates=0, using=DEFAULT_DB_ALIAS,
+                 label='block'):
+    """Allows at most queries statements, duplicates of them repeated.
+
+    Works as a context manager and as a decorator of a test method.
+    """
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    statements = Counter(query['sql'] for query in captured.captured_queries)
+    repeated = {sql: count for sql, count in statements.items() if count > 1}
+    repeats = sum(count - 1 for count in repeated.values())
+    if len(captured) <= queries and repeats <= duplicates:
+        return
+    lines = [f'{label}: {len(captured)} queries (budget {queries}), '
+             f'{repeats} repeated (budget {duplicates})']
+    lines += [f'{count}x {sql}' for sql, count in repeated.items()]
+    lines += [f'  {query["sql"]}' for query in captured.captured_queries]
+    raise QueryBudgetExceeded('\n'.join(lines))
+
+
+class BudgetClient(Client):
+    """Test client failing any request over the budget of its URL."""
+
+    def request(self, **request):
+        try:
+            url_name = resolve(request['PATH_INFO']).view_name
+        except Resolver404:
+            url_name = None
+        if url_name not in BUDGETS:
+            raise QueryBudgetExceeded(f'No query budget for {url_name}')
+        queries, duplicates = BUDGETS[url_name]
+        with query_budget(queries, duplicates, label=url_name):
+            return super().request(**request)
@@ -0,0 +1,24 @@
+"""Base test cases for the project tests.
+
+The shared L2 cache is a directory all local runs and the dev server use,
+test-database ids collide with real ones, so tests get a private
+in-memory L2 instead: clearing it in a test never wipes the dev cache and
+nothing carries over from a previous run.
+"""
+from django.test import SimpleTestCase as DjangoSimpleTestCase
+from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
+
+from .cache import private_caches
+
+TEST_CACHES = private_caches('tests')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SimpleTestCase(DjangoSimpleTestCase):
+    pass
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestCase(DjangoTestCase):
+    pass
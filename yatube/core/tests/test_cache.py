@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.cache import TieredCache
+from core.testing import SimpleTestCase, TestCase
+
+VERSION_KEY = 'posts:feed_version'
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.l2 = caches['shared']
+        self.l2.clear()
+        self.cache = TieredCache('test-tiered', {'OPTIONS': {
+            'L2': 'shared',
+            'MAX_ENTRIES': 2,
+            'L1_TIMEOUT': 5,
+            'L1_EXCLUDE': (VERSION_KEY,),
+        }})
+        self.cache.clear()
+
+    def test_hot_keys_served_from_l1(self):
+        """Within L1_TIMEOUT a key is read from the process memory."""
+        self.cache.set('key', 'value')
+        # другой процесс поменял значение в L2
+        self.l2.set('key', 'changed')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+        with mock.patch('core.cache.time.monotonic',
+                        return_value=10 ** 9):
+            self.assertEqual(self.cache.get('key'), 'changed')
+
+    def test_excluded_keys_always_read_from_l2(self):
+        """Version bumps made by other processes are seen at once."""
+        self.cache.set(VERSION_KEY, 'v1')
+        self.l2.set(VERSION_KEY, 'v2')
+        self.assertEqual(self.cache.get(VERSION_KEY), 'v2')
+
+    def test_l1_is_bounded_lru(self):
+        """The least recently used key leaves L1 but stays in L2."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.l2.set('a', 10)
+        self.l2.set('b', 20)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('b'), 20)
+
+    def test_get_many_combines_tiers(self):
+        """get_many takes L1 hits and asks L2 only for the rest."""
+        self.cache.set('a', 1)
+        self.l2.set('b', 2)
+        with mock.patch.object(self.l2, 'get_many',
+                               wraps=self.l2.get_many) as l2_get_many:
+            self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                             {'a': 1, 'b': 2})
+        l2_get_many.assert_called_once_with(['b', 'c'], version=None)
+
+    def test_writes_reach_both_tiers(self):
+        """delete, incr and clear never leave a stale copy in L1."""
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.incr('key'), 2)
+        self.assertEqual(self.cache.get('key'), 2)
+        self.cache.delete('key')
+        self.assertIsNone(self.l2.get('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.set('key', 1)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_stored_values_are_copies(self):
+        """Changing a fetched object does not change the cached one."""
+        self.cache.set('key', ['value'])
+        self.cache.get('key').append('changed')
+        self.assertEqual(self.cache.get('key'), ['value'])
+
+
+class TestCachesTest(TestCase):
+    def test_tests_use_private_l2(self):
+        """Tests never read or clear the shared cache of the dev server."""
+        l2_alias = settings.CACHES['default']['OPTIONS']['L2']
+        self.assertIsInstance(caches[l2_alias], LocMemCache)
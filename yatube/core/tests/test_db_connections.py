@@ -0,0 +1,80 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import db_connections
+from core.testing import TestCase
+
+User = get_user_model()
+
+
+def fake_connection(usable):
+    return mock.Mock(alias='default', connection=object(),
+                     in_atomic_block=False,
+                     is_usable=mock.Mock(return_value=usable))
+
+
+class ConnectionHealthTest(SimpleTestCase):
+    def events(self):
+        return db_connections.stats()['default']
+
+    def test_opened_connections_counted(self):
+        """connection_created increments the opened counter."""
+        before = self.events()['opened']
+        connection_created.send(sender=type(connection),
+                                connection=connection)
+        self.assertEqual(self.events()['opened'], before + 1)
+
+    def test_broken_connection_dropped(self):
+        """An unusable kept connection is closed before the request."""
+        conn = fake_connection(usable=False)
+        before = self.events()
+        with mock.patch.object(db_connections.connections, 'all',
+                               return_value=[conn]):
+            db_connections.check_connections()
+        conn.close.assert_called_once()
+        self.assertEqual(self.events()['dropped'], before['dropped'] + 1)
+        self.assertEqual(self.events()['reused'], before['reused'])
+
+    @override_settings(DB_HEALTH_CHECKS=False)
+    def test_health_checks_can_be_disabled(self):
+        """Without health checks kept connections are reused as is."""
+        conn = fake_connection(usable=False)
+        before = self.events()['reused']
+        with mock.patch.object(db_connections.connections, 'all',
+                               return_value=[conn]):
+            db_connections.check_connections()
+        conn.is_usable.assert_not_called()
+        self.assertEqual(self.events()['reused'], before + 1)
+
+
+class DBConnectionsViewTest(TestCase):
+    def test_staff_see_counters(self):
+        """The monitoring view returns counters for every database."""
+        self.client.force_login(User.objects.create(
+            username='admin', is_staff=True))
+        response = self.client.get(reverse('core:db_connections'))
+        data = response.json()
+        self.assertEqual(
+            set(data['connections']['default']), set(db_connections.EVENTS))
+        self.assertIn('default', data['conn_max_age'])
+
+    @override_settings(MONITORING_ALLOWED_IPS=['10.0.0.2'])
+    def test_allowed_ips_only(self):
+        """Anonymous users see it only from MONITORING_ALLOWED_IPS."""
+        url = reverse('core:db_connections')
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_hidden_from_internal_ips(self):
+        """INTERNAL_IPS of the debug toolbar do not open monitoring."""
+        response = self.client.get(reverse('core:db_connections'),
+                                   REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
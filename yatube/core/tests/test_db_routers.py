@@ -0,0 +1,84 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import db_routers
+from core.middleware import ReplicaRoutingMiddleware
+from posts.models import Post
+
+REPLICA = 'replica'
+STICKY_COOKIE = 'use_primary_db'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA],
+                   REPLICA_STICKY_COOKIE=STICKY_COOKIE)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routers.ReplicaRouter()
+        db_routers.reset()
+
+    def tearDown(self):
+        db_routers.reset()
+
+    def test_reads_go_to_replicas(self):
+        """Reads use a replica, writes always the primary."""
+        self.assertEqual(self.router.db_for_read(Post), REPLICA)
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_pinned_reads_go_to_primary(self):
+        """use_primary and a write in the request pin reads."""
+        with db_routers.use_primary():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), REPLICA)
+
+        self.router.db_for_write(Post)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_migrations_only_on_primary(self):
+        """Replicas get the schema from the primary, not migrations."""
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_is_primary(self):
+        """No replicas configured - the router changes nothing."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA],
+                   REPLICA_STICKY_COOKIE=STICKY_COOKIE)
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routers.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.read_from = None
+
+    def view(self, request):
+        self.read_from = self.router.db_for_read(Post)
+        if request.method == 'POST':
+            self.router.db_for_write(Post)
+        return HttpResponse()
+
+    def test_write_makes_user_sticky(self):
+        """After a write the response sets the sticky cookie."""
+        middleware = ReplicaRoutingMiddleware(self.view)
+        response = middleware(self.factory.post('/'))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        response = middleware(self.factory.get('/'))
+        self.assertEqual(self.read_from, REPLICA)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_sticky_cookie_pins_reads(self):
+        """Requests with the sticky cookie read from the primary."""
+        middleware = ReplicaRoutingMiddleware(self.view)
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(self.read_from, 'default')
+
+    def test_primary_db_decorator(self):
+        """Views marked primary_db never read from a replica."""
+        middleware = ReplicaRoutingMiddleware(
+            db_routers.primary_db(self.view))
+        middleware(self.factory.get('/'))
+        self.assertEqual(self.read_from, 'default')
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from core import profiling
+from core.testing import TestCase
+from posts.models import Post
+
+User = get_user_model()
+
+
+# страницы из кэша гостей не доходят до ORM, считаем настоящие запросы
+@override_settings(ANONYMOUS_CACHE_TIMEOUT=0)
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        profiling.reset()
+        cache.clear()
+
+    def test_percentiles_per_url_name(self):
+        """Every request lands in the stats of its URL name."""
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+
+        with override_settings(MONITORING_ALLOWED_IPS=['127.0.0.1']):
+            stats = self.client.get(reverse('core:request_stats')).json()
+        self.assertEqual(stats['posts:index']['count'], 3)
+        self.assertEqual(stats['about:author']['count'], 1)
+        index = stats['posts:index']
+        self.assertGreater(index['queries']['p50'], 0)
+        self.assertGreater(index['template_ms']['p99'], 0)
+        self.assertEqual(set(index['total_ms']), {'p50', 'p95', 'p99'})
+
+    @override_settings(PROFILING_MAX_QUERIES=1)
+    def test_slow_requests_logged_with_duplicates(self):
+        """Requests over the limits are logged with repeated SQL."""
+        admin = User.objects.create(username='admin', is_staff=True,
+                                    is_superuser=True)
+        Post.objects.create(author=admin, text='Пост')
+        self.client.force_login(admin)
+        with self.assertLogs('core.profiling', 'WARNING') as logs:
+            self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertIn('admin:posts_post_changelist', logs.output[0])
+        # список админки считает строки дважды: с фильтрами и без
+        self.assertIn('COUNT(*)', logs.output[0])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_can_be_disabled(self):
+        """With profiling off nothing is recorded."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(profiling.percentiles(), {})
+
+    def test_hidden_from_outside(self):
+        """Anonymous users from other addresses get 403."""
+        response = self.client.get(reverse('core:request_stats'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
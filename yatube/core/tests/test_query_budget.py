@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from core.query_budget import BudgetClient, QueryBudgetExceeded, query_budget
+from core.testing import TestCase
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    def test_budget_exceeded(self):
+        """More statements than the budget fail the block."""
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                User.objects.count()
+                User.objects.exists()
+
+    def test_duplicates_exceeded(self):
+        """The same statement repeated fails even within the count."""
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2x SELECT'):
+            with query_budget(5):
+                User.objects.count()
+                User.objects.count()
+
+    @query_budget(1)
+    def test_decorator(self):
+        """query_budget also decorates a whole test."""
+        User.objects.count()
+
+    def test_client_applies_url_budget(self):
+        """BudgetClient checks requests against the URL budget table."""
+        client = BudgetClient()
+        client.get(reverse('about:author'))
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'No query budget'):
+            client.get(reverse('core:db_connections'))
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('monitoring/db/', views.db_connections, name='db_connections'),
+    path('monitoring/requests/', views.request_stats, name='request_stats'),
+]
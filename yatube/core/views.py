@@ -1,5 +1,11 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
 
+from . import db_connections as connection_stats, profiling
+
 
 def page_not_found(request, exception):
     return render(request=request,
@@ -18,3 +24,31 @@ def server_error(request):
                   template_name='core/500.html',
                   context={},
                   status=500)
+
+
+def monitoring_only(view):
+    """Lets only staff and MONITORING_ALLOWED_IPS see the monitoring data."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not (request.user.is_staff
+                or request.META.get('REMOTE_ADDR')
+                in settings.MONITORING_ALLOWED_IPS):
+            return HttpResponseForbidden()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@monitoring_only
+def db_connections(request):
+    """Returns database connection counters of this worker as JSON."""
+    return JsonResponse({
+        'conn_max_age': {alias: config.get('CONN_MAX_AGE', 0)
+                         for alias, config in settings.DATABASES.items()},
+        'connections': connection_stats.stats(),
+    })
+
+
+@monitoring_only
+def request_stats(request):
+    """Returns request timing percentiles per URL name as JSON."""
+    return JsonResponse(profiling.percentiles())
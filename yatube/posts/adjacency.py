@@ -0,0 +1,64 @@
+"""Cached follow graph: the set of author ids every user follows.
+
+"Does X follow Y" becomes a set lookup in the cache instead of a query.
+The sets are for reads only: writes never consult them, they run their
+idempotent statements and trust the row count. Every write path - the
+follow views, the batch API and the Follow signals - edits the cached
+sets after the commit, so a rolled back follow never reaches the cache.
+The sets are mutable, so their prefix is in L1_EXCLUDE.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWING_KEY = 'posts:following:{}'
+
+
+def _key(user_id):
+    return FOLLOWING_KEY.format(user_id)
+
+
+def following_ids(user_id):
+    """frozenset of the author ids the user follows."""
+    ids = cache.get(_key(user_id))
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(
+            user_id=user_id, author__isnull=False,
+        ).values_list('author_id', flat=True))
+        cache.add(_key(user_id), ids, settings.FOLLOWING_CACHE_TIMEOUT)
+    return ids
+
+
+def is_following(user_id, author_id):
+    return author_id in following_ids(user_id)
+
+
+def _apply(pairs, delta):
+    users = {}
+    for user_id, author_id in pairs:
+        users.setdefault(user_id, set()).add(author_id)
+    cached = cache.get_many([_key(user_id) for user_id in users])
+    changed = {}
+    for user_id, author_ids in users.items():
+        ids = cached.get(_key(user_id))
+        # не закэшировано - прочитают из базы при первом обращении
+        if ids is not None:
+            changed[_key(user_id)] = (ids | author_ids if delta > 0
+                                      else ids - author_ids)
+    if changed:
+        cache.set_many(changed, settings.FOLLOWING_CACHE_TIMEOUT)
+
+
+def update(pairs, delta=1):
+    """Adds (delta=1) or removes the pairs in the cache after the commit."""
+    pairs = list(pairs)
+    if pairs:
+        transaction.on_commit(lambda: _apply(pairs, delta))
+
+
+def forget(user_id):
+    """Drops the cached set, the next read loads it from the database."""
+    cache.delete(_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
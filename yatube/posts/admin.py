@@ -2,6 +2,7 @@ from django.contrib import admin
 from yatube.settings import EMPTY_VALUE
 
 from .models import Comment, Follow, Group, Post
+from .search import get_backend
 
 
 @admin.register(Post)
@@ -12,6 +13,12 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = EMPTY_VALUE
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по тексту идет через полнотекстовый индекс, а не LIKE
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
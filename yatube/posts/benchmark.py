@@ -0,0 +1,215 @@
+"""Synthetic dataset and request driver for the benchmark command.
+
+seed() fills the database with mixer/Faker data of the requested size:
+authors with skewed popularity, so a few of them have most followers and
+comments, like on a real site. run() drives the views through the test
+client and collects latency and query counts per scenario, compare()
+checks the results against a stored baseline.
+"""
+import random
+import sys
+import time
+from io import BytesIO
+
+from core.cache import private_caches
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from . import counters, derivatives, timeline
+from .models import Comment, Follow, Group, Post, User
+
+PERCENTILES = (50, 95, 99)
+BENCHMARK_ADDR = '192.0.2.1'
+SCENARIOS = ('index', 'group_posts', 'profile', 'post_detail',
+             'follow_index', 'post_create', 'add_comment')
+WRITES = ('post_create', 'add_comment')
+
+
+def isolated_caches():
+    """CACHES with the same tiers but a private in-memory L2.
+
+    Test-database ids collide with real ones, counters, follow sets and
+    versions written by the benchmark must never reach the shared cache.
+    """
+    return private_caches('benchmark')
+
+
+def _popular(items, count, rng):
+    """Picks items with Zipf-like weights: the first ones are popular."""
+    weights = [1 / (rank + 1) for rank in range(len(items))]
+    return rng.choices(items, weights=weights, k=count)
+
+
+def _image(rng):
+    color = tuple(rng.randrange(256) for _ in range(3))
+    buffer = BytesIO()
+    Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue())
+
+
+def seed(users=200, groups=10, posts=5000, follows=20, comments=10000,
+         images=20, seed=0):
+    """Creates the dataset, returns the ids the scenarios pick from."""
+    rng = random.Random(seed)
+    random.seed(seed)
+    mixer = Mixer(commit=False)
+    mixer.faker.seed_instance(seed)
+
+    User.objects.bulk_create(mixer.cycle(users).blend(
+        User, username=mixer.sequence('bench_user{0}')))
+    user_list = list(User.objects.filter(username__startswith='bench_user'))
+    Group.objects.bulk_create(mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence('bench-group-{0}')))
+    group_list = list(Group.objects.filter(slug__startswith='bench-group-'))
+
+    authors = _popular(user_list, posts, rng)
+    Post.objects.bulk_create([
+        Post(author=author, text=mixer.faker.text(),
+             group=rng.choice(group_list + [None]))
+        for author in authors
+    ])
+    post_ids = list(Post.objects.filter(
+        author__in=user_list).values_list('id', flat=True))
+
+    follow_rows = set()
+    for user in user_list:
+        for author in _popular(user_list, follows, rng):
+            if author.id != user.id:
+                follow_rows.add((user.id, author.id))
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in follow_rows],
+        ignore_conflicts=True)
+    # bulk_create обходит сигналы, ленты подписок и счетчики строим сами
+    for user in user_list:
+        timeline.rebuild_timeline(user.id)
+    counters.reconcile()
+
+    Comment.objects.bulk_create([
+        Comment(post_id=post_id, author=rng.choice(user_list),
+                text=mixer.faker.sentence())
+        for post_id in _popular(post_ids, comments, rng)
+    ])
+
+    for post_id in rng.sample(post_ids, min(images, len(post_ids))):
+        name = default_storage.save(f'posts/bench-{post_id}.jpg', _image(rng))
+        Post.objects.filter(pk=post_id).update(image=name)
+        derivatives.generate(post_id, name)
+
+    return {
+        'users': [user.username for user in user_list],
+        'groups': [group.slug for group in group_list],
+        'posts': post_ids,
+    }
+
+
+def _percentile(values, percent):
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
+
+
+def _request(scenario, data, rng):
+    """Returns (method, url, post data) for one request of the scenario."""
+    if scenario == 'index':
+        page = rng.randint(1, 3)
+        return 'get', reverse('posts:index') + f'?page={page}', {}
+    if scenario == 'group_posts':
+        slug = rng.choice(data['groups'])
+        return 'get', reverse('posts:group_list', kwargs={'sl': slug}), {}
+    if scenario == 'profile':
+        username = _popular(data['users'], 1, rng)[0]
+        return 'get', reverse(
+            'posts:profile', kwargs={'username': username}), {}
+    if scenario == 'post_detail':
+        post_id = _popular(data['posts'], 1, rng)[0]
+        return 'get', reverse(
+            'posts:post_detail', kwargs={'id': post_id}), {}
+    if scenario == 'follow_index':
+        return 'get', reverse('posts:follow_index'), {}
+    if scenario == 'post_create':
+        return 'post', reverse('posts:post_create'), {
+            'text': f'Пост бенчмарка {rng.random()}'}
+    post_id = _popular(data['posts'], 1, rng)[0]
+    return 'post', reverse(
+        'posts:add_comment', kwargs={'post_id': post_id}), {
+            'text': f'Комментарий бенчмарка {rng.random()}'}
+
+
+def run(data, requests=50, scenarios=SCENARIOS, cold=False, seed=0):
+    """Drives every scenario, returns {scenario: metrics}.
+
+    Reads are made by guests, follow_index and writes by a logged in user.
+    cold=True clears the cache before each request to measure the ORM
+    path instead of the cached one; run it under isolated_caches(). The
+    comment rate limit is lifted, every write must end in a redirect:
+    a refused write would measure the 429 shortcut instead.
+    """
+    with override_settings(COMMENT_RATE_LIMIT=sys.maxsize):
+        return _run(data, requests, scenarios, cold, seed)
+
+
+def _run(data, requests, scenarios, cold, seed):
+    rng = random.Random(seed)
+    # адрес не из INTERNAL_IPS: debug_toolbar не должен мерить себя
+    guest = Client(REMOTE_ADDR=BENCHMARK_ADDR)
+    user = Client(REMOTE_ADDR=BENCHMARK_ADDR)
+    user.force_login(User.objects.get(username=data['users'][0]))
+    authenticated = {'follow_index', 'post_create', 'add_comment'}
+
+    results = {}
+    for scenario in scenarios:
+        client = user if scenario in authenticated else guest
+        timings, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, url, post_data = _request(scenario, data, rng)
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = getattr(client, method)(url, post_data)
+                timings.append(time.perf_counter() - request_started)
+            if scenario in WRITES and response.status_code != 302:
+                raise RuntimeError(
+                    f'{scenario}: {method.upper()} {url} answered '
+                    f'{response.status_code}, not a redirect')
+            queries.append(len(captured))
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        metrics = {'requests': requests,
+                   'rps': round(requests / elapsed, 1)}
+        for percent in PERCENTILES:
+            metrics[f'p{percent}_ms'] = round(
+                _percentile(timings, percent) * 1000, 2)
+        metrics['avg_queries'] = round(sum(queries) / len(queries), 1)
+        metrics['max_queries'] = max(queries)
+        results[scenario] = metrics
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Returns the regressions against the baseline as readable lines.
+
+    Latency may grow by the tolerance share, query counts may not grow.
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        if metrics['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{scenario}: p95 {base["p95_ms"]} -> {metrics["p95_ms"]} ms')
+        if metrics['max_queries'] > base['max_queries']:
+            regressions.append(
+                f'{scenario}: queries {base["max_queries"]} -> '
+                f'{metrics["max_queries"]}')
+    return regressions
@@ -0,0 +1,159 @@
+"""Versioned keys for the cached feed fragments and anonymous pages.
+
+Fragments are cached under the current feed version, any change of a
+post, group, author or follow bumps the version, so stale fragments are
+never read again and simply expire. Whole pages served to anonymous
+visitors are tied to page scopes instead - the site, a post, an author,
+a group - each with its own version. A page remembers the versions of
+the scopes it showed and is dropped once any of them is bumped, so a
+comment invalidates the page of its post and not the whole site.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+from itertools import chain
+
+from core.db_routers import use_primary
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+FEED_VERSION_KEY = 'posts:feed_version'
+PAGE_VERSION_KEY = 'posts:page_version:{}'
+# главная страница: любой пост сайта
+SITE = 'site'
+# любая группа: профиль показывает группы своих постов
+GROUPS = 'groups'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_feed_version():
+    """Returns the current feed version, creating it on the first call."""
+    return _get_version(FEED_VERSION_KEY)
+
+
+def bump_feed_version():
+    """Invalidates every cached feed fragment at once."""
+    cache.set(FEED_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _page_versions(scopes):
+    keys = [PAGE_VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def page_version(scope):
+    """Returns the current version of a page scope."""
+    return _page_versions([scope])[PAGE_VERSION_KEY.format(scope)]
+
+
+def post_scopes(post_id, author_id, group_id=None):
+    """Page scopes showing the post: site, its page, author and group."""
+    scopes = [SITE, f'post:{post_id}', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def bump_pages(*scopes):
+    """Invalidates the cached pages that showed any of the scopes."""
+    cache.set_many({PAGE_VERSION_KEY.format(scope): uuid.uuid4().hex
+                    for scope in set(scopes)}, None)
+
+
+def bump_post_pages(posts):
+    """bump_pages() for a queryset of posts changed without signals."""
+    rows = posts.values_list('id', 'author_id', 'group_id')
+    bump_pages(*chain.from_iterable(post_scopes(*row) for row in rows))
+
+
+def depends_on(request, *scopes):
+    """Ties the page rendered for a guest to the scopes it shows.
+
+    Versions are read right away, before the view reads what they guard.
+    Outside cache_anonymous (logged in users) this does nothing.
+    """
+    versions = getattr(request, '_page_versions', None)
+    if versions is not None:
+        versions.update(_page_versions(scopes))
+
+
+def depends_on_posts(request, posts):
+    """depends_on() the authors and groups shown next to the posts."""
+    depends_on(request, *{f'author:{post.author_id}' for post in posts},
+               *{f'group:{post.group_id}' for post in posts
+                 if post.group_id is not None})
+
+
+def _page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{path}'
+
+
+def _is_current(versions):
+    return cache.get_many(list(versions)) == versions
+
+
+def cache_anonymous(view):
+    """Serves anonymous GETs of the view from the cache, with ETag/304.
+
+    The key is the URL with its query string, a cached page is served
+    while the versions of the scopes it declared with depends_on() stay
+    the same. The ETag is the hash of the body and Last-Modified the
+    moment it was cached. Pages are rendered from the primary database
+    before they are stored, so a lagging replica never ends up under a
+    fresh version.
+    Responses setting cookies or not 200 are never stored.
+    ANONYMOUS_CACHE_TIMEOUT = 0 turns the cache off.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.ANONYMOUS_CACHE_TIMEOUT
+        if (not timeout or request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        cached = cache.get(key)
+        if cached is None or not _is_current(cached[-1]):
+            request._page_versions = {}
+            # страница ляжет под свежие версии: реплика могла еще не
+            # получить изменение, из-за которого версию сменили
+            with use_primary():
+                response = view(request, *args, **kwargs)
+            if (response.status_code != 200 or response.streaming
+                    or response.cookies):
+                return response
+            cached = (response.content, response['Content-Type'],
+                      quote_etag(hashlib.md5(response.content).hexdigest()),
+                      int(time.time()), request._page_versions)
+            cache.set(key, cached, timeout)
+
+        content, content_type, etag, last_modified, _ = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # страница одна на всех гостей, но вошедшие видят другую
+        patch_vary_headers(response, ('Cookie',))
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response)
+    return wrapper
@@ -0,0 +1,124 @@
+"""Comment ingestion: post check, rate limit and optional batched writes.
+
+A comment needs only the post id, so the post is checked with EXISTS
+instead of being loaded. Every user may post COMMENT_RATE_LIMIT comments
+per COMMENT_RATE_WINDOW seconds, counted with cache.add and incr in the
+shared tier. The limit is exact only where incr is atomic (Memcached,
+Redis); FileBasedCache does get + set, so concurrent workers may lose
+attempts and let a few extra comments through.
+
+With COMMENT_BATCH_SIZE = 0 (the default) a comment is saved right away.
+Otherwise comments wait in a per-process buffer and a background thread
+writes them with bulk_create, COMMENT_BATCH_SIZE per short transaction,
+every COMMENT_FLUSH_SECONDS or as soon as the buffer is full. A spike on
+a popular post then takes the SQLite write lock once per batch instead
+of once per comment. The buffer is flushed at interpreter exit too, but
+a buffered comment shows up a few seconds late, gets the flush time as
+created (auto_now_add) and is lost if the process is killed before the
+flush - which is why batching is off by default.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from .caching import bump_pages
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+RATE_KEY = 'posts:comment_rate:{}:{}'
+
+_buffer = []
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+_exit_hooked = False
+
+
+def post_exists(post_id):
+    return Post.objects.filter(pk=post_id).exists()
+
+
+def rate_limited(user_id):
+    """Counts the attempt, True once the user is over the limit.
+
+    Best effort on caches without an atomic incr, see the module docstring.
+    """
+    window = settings.COMMENT_RATE_WINDOW
+    key = RATE_KEY.format(user_id, int(time.time() // window))
+    cache.add(key, 0, window)
+    try:
+        attempts = cache.incr(key)
+    except ValueError:
+        # окно истекло между add и incr - это первая попытка в новом
+        attempts = 1
+    return attempts > settings.COMMENT_RATE_LIMIT
+
+
+def flush():
+    """Writes the buffered comments in batches, returns how many."""
+    with _lock:
+        comments, _buffer[:] = _buffer[:], []
+    if not comments:
+        return 0
+    batch_size = settings.COMMENT_BATCH_SIZE or len(comments)
+    for start in range(0, len(comments), batch_size):
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments[start:start + batch_size])
+    # bulk_create обходит сигналы: страницы постов сбрасываем здесь
+    bump_pages(*(f'post:{comment.post_id}' for comment in comments))
+    return len(comments)
+
+
+def _flush_forever():
+    while True:
+        _wakeup.wait(settings.COMMENT_FLUSH_SECONDS)
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Comment batch flush failed')
+        finally:
+            close_old_connections()
+
+
+def _start_worker():
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(
+            target=_flush_forever, name='comments', daemon=True)
+        _worker.start()
+
+
+def _hook_exit():
+    global _exit_hooked
+    if not _exit_hooked:
+        # остаток буфера пишем при штатной остановке процесса
+        atexit.register(flush)
+        _exit_hooked = True
+
+
+def add(comment):
+    """Saves the comment now or queues it for the next batch."""
+    if not settings.COMMENT_BATCH_SIZE:
+        comment.save()
+        return
+    with _lock:
+        _buffer.append(comment)
+        full = len(_buffer) >= settings.COMMENT_BATCH_SIZE
+        _hook_exit()
+        if settings.COMMENT_FLUSH_SECONDS:
+            _start_worker()
+    if not full:
+        return
+    if settings.COMMENT_FLUSH_SECONDS:
+        _wakeup.set()
+    else:
+        # без фонового потока пачку пишет запрос, который ее заполнил
+        flush()
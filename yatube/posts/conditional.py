@@ -0,0 +1,93 @@
+"""ETags for conditional GET of the post and profile pages.
+
+The ETag of a page covers everything it shows that can change: the edit
+time of the posts and the latest comment (deleting a comment touches
+Post.updated), names of the author and the groups, the counters, who is
+asking and their CSRF token. Follows, renames and deleted posts leave no
+timestamp behind, so the pages send no Last-Modified - If-Modified-Since
+alone would answer 304 to a stale page. One query per page plus the
+counter, memoized on the request, feeds the etag of
+django.views.decorators.http condition() and the view. The profile query
+is the author the view renders as well. Groups of the profile posts are
+covered by a version bumped on any group save.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import DateTimeField, Max, OuterRef, Subquery
+from django.shortcuts import get_object_or_404
+
+from . import adjacency, counters
+from .caching import GROUPS, page_version
+from .models import Comment, Post, User
+
+
+def _memoized(func):
+    """condition() asks for the etag and last_modified separately."""
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        attr = f'_{func.__name__}'
+        if not hasattr(request, attr):
+            setattr(request, attr, func(request, *args, **kwargs))
+        return getattr(request, attr)
+    return wrapper
+
+
+def _etag(request, *parts):
+    viewer = (request.user.pk, request.META.get('CSRF_COOKIE'))
+    raw = ':'.join(str(part) for part in (*parts, *viewer))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+@_memoized
+def post_author_posts(request, author_id):
+    """The author's post count, read once for the ETag and the page."""
+    return counters.author_posts(author_id)
+
+
+@_memoized
+def post_etag(request, id):
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')).order_by('-created').values('created')[:1]
+    state = Post.objects.filter(pk=id).annotate(
+        last_comment=Subquery(last_comment),
+    ).values('updated', 'last_comment', 'author_id', 'author__username',
+             'author__first_name', 'author__last_name', 'group__title',
+             'group__slug').first()
+    if state is None:
+        return None
+    last_change = max(filter(None, (state['updated'],
+                                    state['last_comment'])))
+    return _etag(request, id, last_change.isoformat(),
+                 state['author__username'], state['author__first_name'],
+                 state['author__last_name'], state['group__title'],
+                 state['group__slug'],
+                 post_author_posts(request, state['author_id']))
+
+
+@_memoized
+def profile_author(request, username):
+    """The profile author with counters, last post and is_followed.
+
+    One query for the whole profile header, the follow state comes from
+    the cached follow graph; raises Http404.
+    """
+    last_post = Post.objects.filter(author=OuterRef('pk')).order_by().values(
+        'author').annotate(last=Max('updated')).values('last')
+    authors = counters.with_counts(User.objects.all()).annotate(
+        last_post=Subquery(last_post, output_field=DateTimeField()))
+    author = counters.fill_counts(
+        get_object_or_404(authors, username=username))
+    author.is_followed = (request.user.is_authenticated
+                          and adjacency.is_following(request.user.pk,
+                                                     author.pk))
+    return author
+
+
+def profile_etag(request, username):
+    author = profile_author(request, username)
+    last_post = author.last_post
+    return _etag(request, author.pk, author.first_name, author.last_name,
+                 last_post and last_post.isoformat(), author.posts_count,
+                 author.followers_count, author.following_count,
+                 author.is_followed, page_version(GROUPS))
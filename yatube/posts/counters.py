@@ -0,0 +1,227 @@
+"""Denormalized post and follow counters used instead of SELECT COUNT(*).
+
+Counter rows are created lazily from a real count and then moved by
+signals with UPDATE ... SET value = value + 1; follow counters, where a
+missing row means zero, move with a single upsert instead. The global
+counter is also kept in the cache, it is written there only after the
+transaction commits, so a rolled back change never ends up cached.
+with_counts() joins the counters of users to the query that loads them.
+"""
+import collections
+
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Counter, Follow, Post
+
+POSTS_COUNT_KEY = 'posts:count:posts'
+# страховка от гонки чтения с записью: кэш не живет дольше минуты
+POSTS_COUNT_TIMEOUT = 60
+# аннотация with_counts(): счетчик пользователя
+USER_COUNTS = {
+    'posts_count': Counter.AUTHOR_POSTS,
+    'followers_count': Counter.FOLLOWERS,
+    'following_count': Counter.FOLLOWING,
+}
+# счетчики подписок заведены миграцией и сигналами: нет строки - ноль
+EXACT_SCOPES = (Counter.FOLLOWERS, Counter.FOLLOWING)
+
+
+def _real_count(scope, object_id):
+    if scope == Counter.AUTHOR_POSTS:
+        return Post.objects.filter(author_id=object_id).count()
+    if scope == Counter.GROUP_POSTS:
+        return Post.objects.filter(group_id=object_id).count()
+    if scope == Counter.FOLLOWERS:
+        return Follow.objects.filter(author_id=object_id).count()
+    if scope == Counter.FOLLOWING:
+        return Follow.objects.filter(
+            user_id=object_id, author__isnull=False).count()
+    return Post.objects.count()
+
+
+def _create(scope, object_id):
+    counter, _ = Counter.objects.get_or_create(
+        scope=scope, object_id=object_id,
+        defaults={'value': _real_count(scope, object_id)})
+    return counter.value
+
+
+def get_count(scope, object_id=0):
+    """Returns the counter value, counting once if there is no row yet."""
+    value = Counter.objects.filter(
+        scope=scope, object_id=object_id,
+    ).values_list('value', flat=True).first()
+    if value is not None:
+        return value
+    return _create(scope, object_id)
+
+
+def _upsert(scope, object_id, delta):
+    """One statement for the counters where a missing row means zero."""
+    table = Counter._meta.db_table
+    with connections[router.db_for_write(Counter)].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (scope, object_id, value) '
+            f'VALUES (%s, %s, %s) ON CONFLICT (scope, object_id) '
+            f'DO UPDATE SET value = {table}.value + excluded.value',
+            [scope, object_id, delta])
+
+
+def bump(scope, object_id=0, delta=1):
+    """Moves the counter by delta, recounting if there is no row yet."""
+    if scope in EXACT_SCOPES:
+        _upsert(scope, object_id, delta)
+        return
+    updated = Counter.objects.filter(
+        scope=scope, object_id=object_id,
+    ).update(value=F('value') + delta)
+    if not updated:
+        _create(scope, object_id)
+    if scope == Counter.POSTS:
+        cache.delete(POSTS_COUNT_KEY)
+        transaction.on_commit(lambda: cache.delete(POSTS_COUNT_KEY))
+
+
+def drop(scope, object_id):
+    """Forgets the counter of a deleted author or group."""
+    Counter.objects.filter(scope=scope, object_id=object_id).delete()
+
+
+def total_posts():
+    """Number of all posts, served from the cache when possible."""
+    value = cache.get(POSTS_COUNT_KEY)
+    if value is None:
+        value = get_count(Counter.POSTS)
+        transaction.on_commit(
+            lambda: cache.set(POSTS_COUNT_KEY, value, POSTS_COUNT_TIMEOUT))
+    return value
+
+
+def author_posts(author_id):
+    """Number of posts of the author."""
+    return get_count(Counter.AUTHOR_POSTS, author_id)
+
+
+def group_posts(group_id):
+    """Number of posts in the group."""
+    return get_count(Counter.GROUP_POSTS, group_id)
+
+
+def followers(author_id):
+    """Number of users following the author."""
+    return get_count(Counter.FOLLOWERS, author_id)
+
+
+def following(user_id):
+    """Number of authors the user follows."""
+    return get_count(Counter.FOLLOWING, user_id)
+
+
+def with_counts(users):
+    """Annotates a User queryset with the counters of USER_COUNTS.
+
+    Each counter is a subquery of the same SELECT; a post count of None
+    means the row is not there yet, fill_counts() creates it.
+    """
+    annotations = {}
+    for name, scope in USER_COUNTS.items():
+        value = Subquery(Counter.objects.filter(
+            scope=scope, object_id=OuterRef('pk')).values('value')[:1])
+        if scope in EXACT_SCOPES:
+            value = Coalesce(value, 0)
+        annotations[name] = value
+    return users.annotate(**annotations)
+
+
+def fill_counts(user):
+    """Counts what with_counts() did not find, once per user and scope."""
+    for name, scope in USER_COUNTS.items():
+        if getattr(user, name) is None:
+            setattr(user, name, _create(scope, user.pk))
+    return user
+
+
+def count_post(post, delta=1):
+    """Moves every counter the post is part of."""
+    bump(Counter.POSTS, delta=delta)
+    bump(Counter.AUTHOR_POSTS, post.author_id, delta)
+    if post.group_id is not None:
+        bump(Counter.GROUP_POSTS, post.group_id, delta)
+
+
+def count_posts(posts):
+    """Moves the counters once per author/group for a batch of posts."""
+    posts = list(posts)
+    if not posts:
+        return
+    bump(Counter.POSTS, delta=len(posts))
+    authors = collections.Counter(post.author_id for post in posts)
+    for author_id, delta in authors.items():
+        bump(Counter.AUTHOR_POSTS, author_id, delta)
+    groups = collections.Counter(
+        post.group_id for post in posts if post.group_id is not None)
+    for group_id, delta in groups.items():
+        bump(Counter.GROUP_POSTS, group_id, delta)
+
+
+def count_follow(follow, delta=1):
+    """Moves the follower and following counters of a follow."""
+    if follow.author_id is None:
+        return
+    bump(Counter.FOLLOWERS, follow.author_id, delta)
+    bump(Counter.FOLLOWING, follow.user_id, delta)
+
+
+def count_follows(pairs, delta=1):
+    """Moves the follow counters once per user/author for a batch."""
+    pairs = list(pairs)
+    authors = collections.Counter(author_id for _, author_id in pairs)
+    for author_id, count in authors.items():
+        bump(Counter.FOLLOWERS, author_id, count * delta)
+    users = collections.Counter(user_id for user_id, _ in pairs)
+    for user_id, count in users.items():
+        bump(Counter.FOLLOWING, user_id, count * delta)
+
+
+@transaction.atomic
+def reconcile(dry_run=False):
+    """Recounts every counter from the posts and follows tables.
+
+    Returns a list of (scope, object_id, stored, real) for counters that
+    had drifted; stored is None for a counter that did not exist.
+    """
+    real = {(Counter.POSTS, 0): Post.objects.count()}
+    sources = ((Post, 'author_id', Counter.AUTHOR_POSTS),
+               (Post, 'group_id', Counter.GROUP_POSTS),
+               (Follow, 'author_id', Counter.FOLLOWERS),
+               (Follow, 'user_id', Counter.FOLLOWING))
+    for model, field, scope in sources:
+        rows = model.objects.all()
+        if model is Follow:
+            # подписка на удаленного автора никого не считает
+            rows = rows.filter(author__isnull=False)
+        rows = (rows.filter(**{f'{field}__isnull': False})
+                .order_by().values(field).annotate(total=Count('id')))
+        for row in rows:
+            real[(scope, row[field])] = row['total']
+
+    drift = []
+    stored = Counter.objects.all()
+    for counter in stored:
+        key = (counter.scope, counter.object_id)
+        value = real.pop(key, 0)
+        if counter.value != value:
+            drift.append((*key, counter.value, value))
+            if not dry_run:
+                Counter.objects.filter(pk=counter.pk).update(value=value)
+    for (scope, object_id), value in real.items():
+        drift.append((scope, object_id, None, value))
+        if not dry_run:
+            Counter.objects.create(
+                scope=scope, object_id=object_id, value=value)
+    if not dry_run:
+        cache.delete(POSTS_COUNT_KEY)
+    return drift
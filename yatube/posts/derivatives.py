@@ -0,0 +1,125 @@
+"""Responsive derivatives of post images.
+
+At upload time the worker pool cuts the image into POST_IMAGE_WIDTHS wide
+copies in WebP plus a JPEG fallback, cropped like the post thumbnail and
+without EXIF or other metadata. The widths that are ready are stored on
+the post, templates build srcset from them without touching the storage.
+Copies live in a directory named after the full stored image name, which
+the storage keeps unique, and go away with the post or its old image.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import thumbnails
+from .caching import bump_feed_version, bump_post_pages
+from .models import Post
+
+DERIVATIVES_DIR = 'posts/derivatives'
+# пропорции совпадают с превью 960x339
+ASPECT_RATIO = 960 / 339
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+QUALITY = 80
+
+
+def derivatives_dir(image_name):
+    # полное имя, а не stem: cat.jpg и cat.png не делят копии
+    return f'{DERIVATIVES_DIR}/{image_name}'
+
+
+def derivative_name(image_name, width, extension):
+    return f'{derivatives_dir(image_name)}/{width}w.{extension}'
+
+
+def _crop(image):
+    """Center crop to the aspect ratio of the post thumbnail."""
+    width, height = image.size
+    if width / height > ASPECT_RATIO:
+        new_width = round(height * ASPECT_RATIO)
+        left = (width - new_width) // 2
+        return image.crop((left, 0, left + new_width, height))
+    new_height = round(width / ASPECT_RATIO)
+    top = (height - new_height) // 2
+    return image.crop((0, top, width, top + new_height))
+
+
+def generate(post_id, image_name):
+    """Writes the derivatives of the image and marks them on the post."""
+    with default_storage.open(image_name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        # новое изображение без info/exif - метаданные не переносятся
+        image = _crop(image.convert('RGB'))
+
+    widths = [width for width in settings.POST_IMAGE_WIDTHS
+              if width <= image.width] or [image.width]
+    for width in widths:
+        height = round(width / ASPECT_RATIO)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, image_format in FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=QUALITY,
+                         optimize=True)
+            name = derivative_name(image_name, width, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    Post.objects.filter(pk=post_id, image=image_name).update(
+        image_widths=','.join(str(width) for width in widths),
+        updated=timezone.now())
+    bump_feed_version()
+    bump_post_pages(Post.objects.filter(pk=post_id))
+
+
+def schedule(post):
+    """Queues the derivatives of the post image after the commit."""
+    if post.image:
+        post_id, name = post.pk, post.image.name
+        transaction.on_commit(lambda: thumbnails.submit(
+            f'derivatives:{name}', generate, post_id, name))
+
+
+def remove(image_name):
+    """Deletes every copy of the image, whatever widths were cut."""
+    directory = derivatives_dir(image_name)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        default_storage.delete(f'{directory}/{name}')
+
+
+def schedule_removal(image_name):
+    """Queues remove() after the commit: a rollback keeps the copies."""
+    if image_name:
+        transaction.on_commit(lambda: thumbnails.submit(
+            f'derivatives-removal:{image_name}', remove, image_name))
+
+
+def sources(post):
+    """Returns srcset strings for a post whose derivatives are ready."""
+    if not post.image:
+        return None
+    widths = [int(width) for width in post.image_widths.split(',')
+              if width.isdigit()]
+    if not widths:
+        return None
+
+    def url(width, extension):
+        return default_storage.url(
+            derivative_name(post.image.name, width, extension))
+
+    srcset = {
+        extension: ', '.join(f'{url(width, extension)} {width}w'
+                             for width in widths)
+        for extension, _ in FORMATS
+    }
+    srcset['fallback'] = url(widths[-1], 'jpg')
+    return srcset
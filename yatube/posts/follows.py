@@ -0,0 +1,141 @@
+"""Follow and unfollow as single idempotent statements.
+
+follow() is one INSERT ... ON CONFLICT DO NOTHING and unfollow() one
+DELETE, the row count tells whether anything changed. A double click or
+two racing requests end up as a no-op instead of an IntegrityError on the
+unique constraint. Model signals do not fire for raw statements, so the
+side effects the Follow signals apply - timeline, counters, feed version -
+are applied here, only when a row was actually written.
+
+follow_many() and unfollow_many() apply a whole follow-graph diff for
+imports and account migrations: chunks of bulk INSERT/DELETE, each in its
+own transaction, with the counters and timelines moved once per chunk and
+the feed version bumped once at the end.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from . import adjacency, counters, timeline
+from .caching import bump_feed_version, bump_pages
+from .models import Follow
+
+TABLE = Follow._meta.db_table
+# две колонки на пару: не больше 999 параметров старого SQLite
+BATCH_SIZE = 400
+
+
+def _write(sql, params, user_id, author_id, delta):
+    """Runs the statement, applies the side effects if a row changed."""
+    using = router.db_for_write(Follow)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, params)
+            changed = cursor.rowcount == 1
+        if changed:
+            timeline_change = (timeline.add_author if delta > 0
+                               else timeline.remove_author)
+            timeline_change(user_id, author_id)
+            counters.count_follow(
+                Follow(user_id=user_id, author_id=author_id), delta)
+            adjacency.update([(user_id, author_id)], delta)
+            bump_feed_version()
+            bump_pages(f'author:{user_id}', f'author:{author_id}')
+    return changed
+
+
+def follow(user_id, author_id):
+    """Subscribes the user, returns False if nothing changed."""
+    # CHECK-ограничение ON CONFLICT не гасит, себя отсекаем заранее
+    if user_id == author_id:
+        return False
+    return _write(
+        f'INSERT INTO {TABLE} (user_id, author_id) VALUES (%s, %s) '
+        f'ON CONFLICT DO NOTHING',
+        [user_id, author_id], user_id, author_id, 1)
+
+
+def unfollow(user_id, author_id):
+    """Unsubscribes the user, returns False if there was no follow."""
+    return _write(
+        f'DELETE FROM {TABLE} WHERE user_id = %s AND author_id = %s',
+        [user_id, author_id], user_id, author_id, -1)
+
+
+def _validated(pairs):
+    """Unique (user_id, author_id) pairs, self follows are a ValueError."""
+    pairs = list(dict.fromkeys(pairs))
+    # 'user and author can not be equal' проверяем до первой записи
+    invalid = [pair for pair in pairs if pair[0] == pair[1]]
+    if invalid:
+        raise ValueError(f'Users can not follow themselves: {invalid}')
+    return pairs
+
+
+def _chunks(pairs, batch_size):
+    for start in range(0, len(pairs), batch_size):
+        yield pairs[start:start + batch_size]
+
+
+def _existing(pairs):
+    """{(user_id, author_id): follow id} of the pairs already stored."""
+    condition = Q()
+    for user_id, author_id in pairs:
+        condition |= Q(user_id=user_id, author_id=author_id)
+    rows = Follow.objects.filter(condition).values_list(
+        'user_id', 'author_id', 'id')
+    return {(user_id, author_id): pk for user_id, author_id, pk in rows}
+
+
+def _profiles(pairs):
+    """Page scopes of both sides of the follows, their counters moved."""
+    return {f'author:{user_id}' for pair in pairs for user_id in pair}
+
+
+def follow_many(pairs, batch_size=BATCH_SIZE):
+    """Creates the (user_id, author_id) follows, returns how many are new."""
+    pairs = _validated(pairs)
+    using = router.db_for_write(Follow)
+    created = 0
+    for chunk in _chunks(pairs, batch_size):
+        with transaction.atomic(using=using):
+            existing = _existing(chunk)
+            new = [pair for pair in chunk if pair not in existing]
+            # гонку с одиночной подпиской гасит ignore_conflicts
+            Follow.objects.bulk_create(
+                [Follow(user_id=user_id, author_id=author_id)
+                 for user_id, author_id in new],
+                ignore_conflicts=True)
+            timeline.add_follows(new)
+            counters.count_follows(new)
+            adjacency.update(new)
+            bump_pages(*_profiles(new))
+        created += len(new)
+    if created:
+        bump_feed_version()
+    return created
+
+
+def unfollow_many(pairs, batch_size=BATCH_SIZE):
+    """Deletes the (user_id, author_id) follows, returns how many existed."""
+    pairs = _validated(pairs)
+    using = router.db_for_write(Follow)
+    deleted = 0
+    for chunk in _chunks(pairs, batch_size):
+        with transaction.atomic(using=using):
+            existing = _existing(chunk)
+            if not existing:
+                continue
+            # без QuerySet.delete(): сигналы посчитали бы каждую строку
+            ids = list(existing.values())
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {TABLE} WHERE id IN '
+                    f'({", ".join(["%s"] * len(ids))})', ids)
+            timeline.remove_follows(existing)
+            counters.count_follows(existing, -1)
+            adjacency.update(existing, -1)
+            bump_pages(*_profiles(existing))
+        deleted += len(existing)
+    if deleted:
+        bump_feed_version()
+    return deleted
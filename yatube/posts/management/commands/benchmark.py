@@ -0,0 +1,103 @@
+import json
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+COLUMNS = ('requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms',
+           'avg_queries', 'max_queries')
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway database with synthetic data and measures '
+            'latency and query counts of the main views.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Authors followed by every user.')
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Requests made in every scenario.')
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=benchmark.SCENARIOS,
+            default=benchmark.SCENARIOS)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Clear the cache before every request.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--baseline',
+            help='JSON file with the results to compare against.')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Write the results into the --baseline file.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 growth against the baseline, 0.2 = 20%%.')
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline PATH')
+
+        old_name = connection.settings_dict['NAME']
+        # своя база, медиа и кэш: рабочие данные бенчмарк не трогает
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, DATABASE_REPLICAS=[],
+                CACHES=benchmark.isolated_caches()):
+            # L1 общий для процесса: чистим его вместе с приватным L2
+            cache.clear()
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write('Seeding...')
+                data = benchmark.seed(
+                    users=options['users'], groups=options['groups'],
+                    posts=options['posts'], follows=options['follows'],
+                    comments=options['comments'], images=options['images'],
+                    seed=options['seed'])
+                results = benchmark.run(
+                    data, requests=options['requests'],
+                    scenarios=options['scenarios'], cold=options['cold'],
+                    seed=options['seed'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                cache.clear()
+
+        self.report(results)
+        self.check_baseline(results, options)
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"scenario":<14}' + ''.join(f'{c:>13}' for c in COLUMNS))
+        for scenario, metrics in results.items():
+            self.stdout.write(f'{scenario:<14}' + ''.join(
+                f'{metrics[c]:>13}' for c in COLUMNS))
+
+    def check_baseline(self, results, options):
+        path = options['baseline']
+        if not path:
+            return
+        if options['save_baseline']:
+            with open(path, 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved: {path}'))
+            return
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = benchmark.compare(
+            results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError(
+                'Regressions against the baseline:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,73 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+from posts.models import Follow, User
+
+HEADER = ('user', 'author')
+
+
+class Command(BaseCommand):
+    help = ('Exports the follow graph as CSV (user,author usernames) or '
+            'applies such a file as follows or unfollows in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('export', 'follow', 'unfollow'))
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='CSV file, "-" for stdin/stdout.')
+        parser.add_argument(
+            '--batch-size', type=int, default=follows.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['action'] == 'export':
+            self.export(options['path'])
+            return
+        pairs = self.read(options['path'])
+        apply = (follows.follow_many if options['action'] == 'follow'
+                 else follows.unfollow_many)
+        try:
+            changed = apply(pairs, batch_size=options['batch_size'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'{changed} of {len(pairs)} follow(s) changed'))
+
+    def export(self, path):
+        out = self.stdout if path == '-' else open(path, 'w', newline='')
+        try:
+            writer = csv.writer(out)
+            writer.writerow(HEADER)
+            rows = Follow.objects.filter(author__isnull=False).values_list(
+                'user__username', 'author__username').order_by('id')
+            for row in rows.iterator():
+                writer.writerow(row)
+        finally:
+            if out is not self.stdout:
+                out.close()
+
+    def read(self, path):
+        """Reads the CSV and turns usernames into (user_id, author_id)."""
+        source = sys.stdin if path == '-' else open(path, newline='')
+        try:
+            rows = [tuple(row) for row in csv.reader(source) if row]
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        if rows and rows[0] == HEADER:
+            rows = rows[1:]
+        broken = [row for row in rows if len(row) != len(HEADER)]
+        if broken:
+            raise CommandError(f'Expected user,author rows: {broken[:5]}')
+        usernames = sorted({username for row in rows for username in row})
+        ids = {}
+        for start in range(0, len(usernames), follows.BATCH_SIZE):
+            ids.update(User.objects.filter(
+                username__in=usernames[start:start + follows.BATCH_SIZE],
+            ).values_list('username', 'id'))
+        unknown = [username for username in usernames if username not in ids]
+        if unknown:
+            raise CommandError(f'Unknown users: {", ".join(unknown)}')
+        return [(ids[user], ids[author]) for user, author in rows]
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import derivatives, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Generates missing thumbnails and responsive copies of images.'
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True)
+        generated = 0
+        for name in images.iterator():
+            if thumbnails.ready_thumbnail(name) is None:
+                thumbnails.generate(name)
+                generated += 1
+        posts = Post.objects.exclude(image='').filter(
+            image_widths='').values_list('id', 'image')
+        cut = 0
+        for post_id, name in posts.iterator():
+            derivatives.generate(post_id, name)
+            cut += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{generated} thumbnail(s) generated, '
+            f'{cut} image(s) cut into copies'))
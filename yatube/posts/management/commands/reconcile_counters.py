@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recounts the denormalized post counters and fixes drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the drift, do not write anything.',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile(dry_run=options['dry_run'])
+        for scope, object_id, stored, real in drift:
+            self.stdout.write(f'{scope}:{object_id} {stored} -> {real}')
+        verb = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(drift)} counter(s) {verb}'))
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_follow_counters(apps, schema_editor):
+    """Profiles read a missing follow counter as zero, so count them all."""
+    Counter = apps.get_model('posts', 'Counter')
+    Follow = apps.get_model('posts', 'Follow')
+    follows = Follow.objects.filter(author__isnull=False).order_by()
+    rows = []
+    for field, scope in (('author_id', 'followers'),
+                         ('user_id', 'following')):
+        rows += [
+            Counter(scope=scope, object_id=row[field], value=row['total'])
+            for row in follows.values(field).annotate(total=Count('id'))
+        ]
+    Counter.objects.bulk_create(rows)
+
+
+def drop_follow_counters(apps, schema_editor):
+    Counter = apps.get_model('posts', 'Counter')
+    Counter.objects.filter(scope__in=('followers', 'following')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_updated'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='counter',
+            name='scope',
+            field=models.CharField(choices=[('posts', 'Все статьи'), ('author_posts', 'Статьи автора'), ('group_posts', 'Статьи группы'), ('followers', 'Подписчики автора'), ('following', 'Подписки пользователя')], max_length=32, verbose_name='Что считаем'),
+        ),
+        migrations.RunPython(fill_follow_counters, drop_follow_counters),
+    ]
@@ -1,11 +1,36 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 # from pytils.translit import slugify
 
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Posts for list pages: author and group joined in one query."""
+        return self.select_related('author', 'group').defer(
+            'author__password', 'group__description')
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        """bulk_create skips signals, so the counters are moved here.
+
+        Timelines and the search index are not: SQLite returns no ids, so
+        the caller rebuilds them (timeline.rebuild_timeline()). Conflicts
+        are not ignored: skipped rows can not be told from inserted ones.
+        """
+        from .counters import count_posts
+
+        if ignore_conflicts:
+            raise ValueError(
+                'Post.objects.bulk_create() does not support '
+                'ignore_conflicts: skipped posts would be counted.')
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, batch_size=batch_size)
+            count_posts(created)
+        return created
+
+
 class Post(models.Model):
     """Table of posts."""
     text = models.TextField(
@@ -18,6 +43,11 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    # для ETag страниц поста и профиля
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     author = models.ForeignKey(
         to=User,
         on_delete=models.CASCADE,
@@ -39,6 +69,16 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Выбери картинку',
     )
+    # ширины готовых адаптивных копий картинки, см. posts.derivatives
+    image_widths = models.CharField(
+        max_length=50,
+        blank=True,
+        editable=False,
+        verbose_name='Готовые размеры картинки',
+    )
+
+    objects = PostQuerySet.as_manager()
+
     # comments = models.ForeignKey(
     #     to='Comments',
     #     on_delete=models.SET_NULL,
@@ -49,12 +89,33 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        # ленты читаются по индексу в порядке вывода, без сортировки;
+        # id в конце - для keyset-пагинации (-pub_date, -pk)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
 
     def __str__(self) -> str:
         return self.text[:20]
 
+    def save(self, *args, **kwargs):
+        # сама запись и счетчики из сигналов - одна транзакция
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     # def __str__(self):
     #    preview = self.text[0:50]
     #    date = self.pub_date.date()
@@ -111,6 +172,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx',
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -151,3 +218,87 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} подписан на автора {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Precomputed follow feed: one row per (follower, post)."""
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        to='Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Статья',
+    )
+    # копия post.pub_date, чтобы лента читалась одним проходом по индексу
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='timeline_user_pub_date_idx',
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='post is in timeline once',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self) -> str:
+        return f'{self.post} в ленте {self.user}'
+
+
+class Counter(models.Model):
+    """Denormalized counters, kept up to date by signals."""
+    POSTS = 'posts'
+    AUTHOR_POSTS = 'author_posts'
+    GROUP_POSTS = 'group_posts'
+    FOLLOWERS = 'followers'
+    FOLLOWING = 'following'
+    SCOPES = (
+        (POSTS, 'Все статьи'),
+        (AUTHOR_POSTS, 'Статьи автора'),
+        (GROUP_POSTS, 'Статьи группы'),
+        (FOLLOWERS, 'Подписчики автора'),
+        (FOLLOWING, 'Подписки пользователя'),
+    )
+
+    scope = models.CharField(
+        max_length=32,
+        choices=SCOPES,
+        verbose_name='Что считаем',
+    )
+    # id пользователя или группы, для глобальных счетчиков - 0
+    object_id = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Объект',
+    )
+    value = models.IntegerField(
+        default=0,
+        verbose_name='Значение',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('scope', 'object_id'),
+                name='one counter per object',
+            ),
+        )
+        verbose_name = 'Счетчик'
+        verbose_name_plural = 'Счетчики'
+
+    def __str__(self) -> str:
+        return f'{self.scope}:{self.object_id} = {self.value}'
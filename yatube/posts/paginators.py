@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ('-pub_date', '-pk')
+
+
+class CountedPaginator(Paginator):
+    """Paginator taking its total from a counter instead of COUNT(*).
+
+    count is a callable, it is asked only when the page needs the total.
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count()
+
+
+class CursorPage(Sequence):
+    """A page of objects fetched by the keyset (cursor) paginator."""
+    cursor_based = True
+
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.paginator = paginator
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'prev')
+
+
+class CursorPaginator:
+    """Paginates a queryset by keyset instead of LIMIT/OFFSET.
+
+    Each page is fetched with a WHERE on the ordering key of the last
+    (or first) object of the neighbouring page, so deep pages cost the same
+    as the first one and no COUNT(*) is issued. All ordering fields must
+    share one direction, the last of them has to be unique (usually pk).
+    Fields of related models (timeline_entries__pub_date) are allowed.
+    """
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING):
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.descending = self.ordering[0].startswith('-')
+        paths = [name.lstrip('-') for name in self.ordering]
+        self.fields = [self._resolve(object_list.model, path)
+                       for path in paths]
+        # поле связанной модели читаем через аннотацию: условие по пути
+        # в отдельном filter() добавило бы к запросу второй JOIN
+        self.field_names = [
+            f'cursor_key_{i}' if LOOKUP_SEP in path else path
+            for i, path in enumerate(paths)]
+        annotations = {name: F(path)
+                       for name, path in zip(self.field_names, paths)
+                       if name != path}
+        self.object_list = object_list.annotate(**annotations)
+        prefix = '-' if self.descending else ''
+        self.key_ordering = [prefix + name for name in self.field_names]
+
+    @staticmethod
+    def _resolve(model, path):
+        *relations, name = path.split(LOOKUP_SEP)
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        """Returns an opaque token pointing right after/before the obj."""
+        values = [getattr(obj, name) for name in self.field_names]
+        values = [value.isoformat() if hasattr(value, 'isoformat')
+                  else str(value) for value in values]
+        raw = json.dumps([direction, *values]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Returns (direction, values) or None for a malformed token."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, *raw_values = json.loads(
+                base64.urlsafe_b64decode(padded.encode()))
+            if (direction not in ('next', 'prev')
+                    or len(raw_values) != len(self.fields)):
+                return None
+            values = [field.to_python(value)
+                      for field, value in zip(self.fields, raw_values)]
+        except (binascii.Error, ValueError, TypeError, AttributeError,
+                ValidationError):
+            return None
+        if any(value is None for value in values):
+            return None
+        return direction, values
+
+    def _seek(self, values, forward):
+        """Builds (a < v1) OR (a = v1 AND b < v2) ... for the key."""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.field_names):
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.field_names[:i], values):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.key_ordering]
+
+    def get_page(self, cursor=None):
+        """Returns a CursorPage, the first one if the cursor is invalid."""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        queryset = self.object_list
+        if decoded is None:
+            objects = list(
+                queryset.order_by(*self.key_ordering)[:self.per_page + 1])
+            return CursorPage(objects[:self.per_page],
+                              len(objects) > self.per_page, False, self)
+
+        direction, values = decoded
+        if direction == 'next':
+            objects = list(
+                queryset.filter(self._seek(values, forward=True))
+                .order_by(*self.key_ordering)[:self.per_page + 1])
+            return CursorPage(objects[:self.per_page],
+                              len(objects) > self.per_page, True, self)
+
+        objects = list(
+            queryset.filter(self._seek(values, forward=False))
+            .order_by(*self._reversed_ordering())[:self.per_page + 1])
+        has_previous = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        objects.reverse()
+        return CursorPage(objects, True, has_previous, self)
@@ -0,0 +1,139 @@
+"""Full-text search over posts.
+
+On SQLite the posts are mirrored into an FTS5 table keyed by post id and
+kept in sync by signals, so a search reads the inverted index instead of
+LIKE '%term%' over every row. Other databases fall back to LikeBackend
+until a native backend is plugged in through SEARCH_BACKEND.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+WORD_RE = re.compile(r'\w+')
+
+
+def fts_query(query):
+    """Turns user input into a safe FTS5 query: all words, last as prefix."""
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SearchResults:
+    """Lazy ranked results for Paginator: len() and slices hit the index."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        ids = self.backend.ranked_ids(self.query, start, index.stop - start)
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class LikeBackend:
+    """Fallback without an index: LIKE over the text, newest first."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def filter(self, queryset, query):
+        return queryset.filter(text__icontains=query)
+
+    def count(self, query):
+        return self.filter(Post.objects.all(), query).count()
+
+    def ranked_ids(self, query, offset, limit):
+        ids = self.filter(Post.objects.all(), query).values_list(
+            'id', flat=True)
+        return list(ids[offset:offset + limit])
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+
+class SQLiteFTSBackend(LikeBackend):
+    """FTS5 inverted index, results ordered by bm25 rank."""
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            # удаляем и вставляем заново: так же работает и правка поста
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def filter(self, queryset, query):
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        # не pk__in=RawSQL(...): SQLite читает IN ((SELECT ...)) как
+        # скалярный подзапрос и берет только первую строку
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            where=[f'"{table}"."id" IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match])
+
+    def count(self, query):
+        match = fts_query(query)
+        if not match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [match])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, query, offset, limit):
+        match = fts_query(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s', [match, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    """Returns the configured backend, FTS5 on SQLite by default."""
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path is None:
+        path = ('posts.search.SQLiteFTSBackend'
+                if connection.vendor == 'sqlite'
+                else 'posts.search.LikeBackend')
+    return _load_backend(path)
@@ -0,0 +1,191 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (adjacency, counters, derivatives, search, thumbnails,
+               timeline)
+from .caching import GROUPS, bump_feed_version, bump_pages, post_scopes
+from .models import Comment, Counter, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    """Fans a new post out to the followers' timelines."""
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_before_edit(sender, instance, raw=False, **kwargs):
+    """Remembers the stored group and image of an edited post."""
+    if raw or instance.pk is None:
+        return
+    instance._stored_group_id, instance._stored_image = (
+        Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first() or (None, ''))
+    if instance.image.name != instance._stored_image:
+        # старые копии другой картинки больше не подходят
+        instance.image_widths = ''
+        derivatives.schedule_removal(instance._stored_image)
+
+
+@receiver(post_save, sender=Post)
+def post_counted(sender, instance, created, raw=False, **kwargs):
+    """Keeps the post counters of the author, group and site."""
+    if raw:
+        return
+    if created:
+        counters.count_post(instance)
+        return
+    stored_group_id = getattr(instance, '_stored_group_id', None)
+    if stored_group_id != instance.group_id:
+        if stored_group_id is not None:
+            counters.bump(Counter.GROUP_POSTS, stored_group_id, -1)
+        if instance.group_id is not None:
+            counters.bump(Counter.GROUP_POSTS, instance.group_id)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, raw=False, **kwargs):
+    """Hands the thumbnail and copies of a new image to the workers."""
+    if raw or not instance.image:
+        return
+    if created or instance.image.name != getattr(
+            instance, '_stored_image', None):
+        thumbnails.schedule(instance.image)
+        derivatives.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, raw=False, **kwargs):
+    """Keeps the full-text index in line with the post text."""
+    if not raw:
+        search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindexed(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_derivatives_removed(sender, instance, **kwargs):
+    derivatives.schedule_removal(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_uncounted(sender, instance, **kwargs):
+    counters.count_post(instance, -1)
+
+
+@receiver(post_delete, sender=Group)
+def group_uncounted(sender, instance, **kwargs):
+    counters.drop(Counter.GROUP_POSTS, instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def author_uncounted(sender, instance, **kwargs):
+    for scope in (Counter.AUTHOR_POSTS, Counter.FOLLOWERS,
+                  Counter.FOLLOWING):
+        counters.drop(scope, instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def author_unfollowed(sender, instance, **kwargs):
+    """SET_NULL skips Follow signals, so the followers are uncounted here."""
+    followers = Follow.objects.filter(author=instance).values_list(
+        'user_id', flat=True)
+    for user_id in followers:
+        counters.bump(Counter.FOLLOWING, user_id, -1)
+    adjacency.update([(user_id, instance.pk) for user_id in followers], -1)
+    bump_pages(*(f'author:{user_id}' for user_id in followers))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    """Keeps the follower's timeline in line with the follow graph."""
+    if raw:
+        return
+    if created and instance.author_id is not None:
+        timeline.add_author(instance.user_id, instance.author_id)
+        counters.count_follow(instance)
+        adjacency.update([(instance.user_id, instance.author_id)])
+    else:
+        # подписку отредактировали (например, в админке) - пересобираем
+        timeline.rebuild_timeline(instance.user_id)
+        adjacency.forget(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Removes the unfollowed author's posts from the timeline."""
+    if instance.author_id is not None:
+        timeline.remove_author(instance.user_id, instance.author_id)
+        counters.count_follow(instance, -1)
+        adjacency.update([(instance.user_id, instance.author_id)], -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=User)
+def feed_changed(sender, **kwargs):
+    """Anything shown in a feed changed - drop the cached fragments."""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_pages_changed(sender, instance, **kwargs):
+    """The index, the post page, its author and groups, old and new."""
+    scopes = post_scopes(instance.pk, instance.author_id, instance.group_id)
+    stored_group_id = getattr(instance, '_stored_group_id', None)
+    if stored_group_id is not None:
+        scopes.append(f'group:{stored_group_id}')
+    bump_pages(*scopes)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, instance, **kwargs):
+    bump_pages(f'group:{instance.pk}', GROUPS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages_changed(sender, instance, **kwargs):
+    """Both profiles show the follow counters."""
+    bump_pages(*(f'author:{user_id}'
+                 for user_id in (instance.user_id, instance.author_id)
+                 if user_id is not None))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    """Renamed authors invalidate the feed, logins do not."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_feed_version()
+    bump_pages(f'author:{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def author_pages_changed(sender, instance, **kwargs):
+    bump_pages(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comments_changed(sender, instance, **kwargs):
+    """Comments are not in the feed, only the page of the post is stale."""
+    bump_pages(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Max(created) does not move on delete, the post edit time does."""
+    Post.objects.filter(pk=instance.post_id).update(updated=timezone.now())
@@ -0,0 +1,26 @@
+from django import template
+
+from posts import derivatives, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Returns the ready thumbnail of the post image or None."""
+    if hasattr(post, 'prefetched_thumbnail'):
+        return post.prefetched_thumbnail
+    return thumbnails.ready_thumbnail(post.image)
+
+
+@register.simple_tag
+def post_sources(post):
+    """Returns srcset strings of the post image copies or None."""
+    return derivatives.sources(post)
+
+
+@register.simple_tag
+def prefetch_thumbnails(page_obj):
+    """Resolves the thumbnails of the whole page before the loop."""
+    thumbnails.prefetch_thumbnails(page_obj)
+    return ''
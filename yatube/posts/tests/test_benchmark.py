@@ -0,0 +1,65 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import override_settings
+
+from core.testing import TestCase
+from posts import benchmark
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_and_run(self):
+        """A tiny dataset is seeded and every scenario is measured."""
+        data = benchmark.seed(users=5, groups=2, posts=30, follows=3,
+                              comments=20, images=1)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(Post.objects.exclude(image='').count(), 1)
+
+        results = benchmark.run(data, requests=2)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for metrics in results.values():
+            self.assertEqual(metrics['requests'], 2)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+        self.assertEqual(Post.objects.count(), 32)
+
+    @override_settings(COMMENT_RATE_LIMIT=1)
+    def test_writes_not_rate_limited(self):
+        """Every measured comment is written, none is refused with 429."""
+        data = benchmark.seed(users=3, groups=1, posts=5, follows=1,
+                              comments=0, images=0)
+        benchmark.run(data, requests=5, scenarios=('add_comment',))
+        self.assertEqual(Comment.objects.count(), 5)
+
+    def test_compare_reports_regressions(self):
+        """Slower p95 or more queries than the baseline are regressions."""
+        baseline = {'index': {'p95_ms': 10, 'max_queries': 2}}
+        self.assertEqual(benchmark.compare(
+            {'index': {'p95_ms': 11, 'max_queries': 2}}, baseline), [])
+        regressions = benchmark.compare(
+            {'index': {'p95_ms': 20, 'max_queries': 3}}, baseline)
+        self.assertEqual(len(regressions), 2)
+
+    def test_isolated_caches(self):
+        """The benchmark cache never writes into the shared tier."""
+        cache.set('real', 1)
+        with override_settings(CACHES=benchmark.isolated_caches()):
+            cache.clear()
+            cache.set('posts:count:posts', 42)
+            self.assertIsNone(cache.get('real'))
+            cache.clear()
+        self.assertIsNone(caches['shared'].get('posts:count:posts'))
+        self.assertEqual(cache.get('real'), 1)
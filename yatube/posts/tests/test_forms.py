@@ -1,12 +1,17 @@
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from django.test import TestCase, Client, override_settings
+from django.test import override_settings
 from django.urls.base import reverse
 
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+from posts import comments
 from posts.models import Post, User, Group, Comment
 
 
@@ -43,7 +48,7 @@ class TestPostForm(TestCase):
             author=cls.auth_author,
             group_id=cls.group.id,
         )
-        cls.author_client = Client()
+        cls.author_client = BudgetClient()
         cls.author_client.force_login(cls.auth_author)
 
     @classmethod
@@ -145,9 +150,12 @@ class TestComment(TestCase):
         self.auth_author = User.objects.create(username=AUTHOR)
         self.post = Post.objects.create(
             author=self.auth_author, text=f'{POST_TEXT}')
-        self.guest_client = Client()
-        self.author_client = Client()
+        self.guest_client = BudgetClient()
+        self.author_client = BudgetClient()
         self.author_client.force_login(self.auth_author)
+        self.comment_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id})
+        cache.clear()
 
     def test_comments_form_auth_user(self):
         """
@@ -192,3 +200,37 @@ class TestComment(TestCase):
         )
         comments_after = Comment.objects.count()
         self.assertEqual(comments_after, comments_before)
+
+    def test_comment_on_missing_post(self):
+        """A comment to a missing post is 404, not a server error."""
+        response = self.author_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 0}),
+            data={'text': COMMENT})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(COMMENT_RATE_LIMIT=2)
+    def test_comments_rate_limited(self):
+        """Comments over the per-user limit are refused with 429."""
+        statuses = [
+            self.author_client.post(
+                self.comment_url, data={'text': f'{COMMENT} {i}'},
+            ).status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [HTTPStatus.FOUND, HTTPStatus.FOUND,
+                                    HTTPStatus.TOO_MANY_REQUESTS])
+        self.assertEqual(Comment.objects.count(), 2)
+
+    # без фонового потока пачку пишет запрос, который ее заполнил
+    @override_settings(COMMENT_BATCH_SIZE=2, COMMENT_FLUSH_SECONDS=0)
+    def test_comments_written_in_batches(self):
+        """Buffered comments are written once the batch is full."""
+        self.author_client.post(self.comment_url, data={'text': COMMENT})
+        self.assertFalse(Comment.objects.exists())
+        self.author_client.post(self.comment_url, data={'text': COMMENT})
+        self.assertEqual(Comment.objects.count(), 2)
+
+        self.author_client.post(self.comment_url, data={'text': COMMENT})
+        self.assertEqual(comments.flush(), 1)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 3)
@@ -0,0 +1,77 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+from posts.models import Comment, Follow, Group, Post, User
+
+
+AUTHOR = 'author'
+AUTH_USER = 'auth_user'
+SLUG = 'test-slug'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class FeedIndexesTest(TestCase):
+    """Every list query walks an index in output order, no filesort."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.auth_author = User.objects.create(username=AUTHOR)
+        cls.auth_user = User.objects.create(username=AUTH_USER)
+        cls.group = Group.objects.create(
+            title='Тест групп', description='Тестовое описание', slug=SLUG)
+        Follow.objects.create(user=cls.auth_user, author=cls.auth_author)
+        for i in range(30):
+            Post.objects.create(author=cls.auth_author, text=f'Пост {i}',
+                                group=cls.group)
+        cls.post = Post.objects.latest('pub_date')
+        for i in range(30):
+            Comment.objects.create(post=cls.post, author=cls.auth_user,
+                                   text=f'Комментарий {i}')
+        cls.user_client = BudgetClient()
+        cls.user_client.force_login(cls.auth_user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def assert_index_ordered(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = FeedIndexesTest.user_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        ordered = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('SELECT')
+                   and 'ORDER BY' in query['sql']]
+        self.assertTrue(ordered, f'{url} ran no ordered queries')
+        with connection.cursor() as cursor:
+            for sql in ordered:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                self.assertNotIn('TEMP B-TREE', plan, f'{url}: {sql}')
+
+    def test_list_queries_use_indexes(self):
+        page_obj = FeedIndexesTest.user_client.get(
+            reverse('posts:index')).context['page_obj']
+        follow_page_obj = FeedIndexesTest.user_client.get(
+            reverse('posts:follow_index')).context['page_obj']
+        self.assertIsNotNone(follow_page_obj.next_cursor)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:index') + f'?cursor={page_obj.next_cursor}',
+            reverse('posts:group_list', kwargs={'sl': SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index')
+            + f'?cursor={follow_page_obj.next_cursor}',
+            reverse('posts:post_detail',
+                    kwargs={'id': FeedIndexesTest.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_index_ordered(url)
@@ -1,7 +1,17 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
 from django.db.utils import IntegrityError
-from django.test import TestCase
 
-from posts.models import Comment, Follow, Group, Post, User
+from core.testing import TestCase
+from posts import adjacency, counters, follows
+from posts.models import (Comment, Counter, Follow, Group, Post,
+                          TimelineEntry, User)
 
 
 GROUP_TITLE = 'Тест групп'
@@ -92,3 +102,171 @@ class FollowModelTest(TestCase):
         Follow.objects.create(user=self.auth_user, author=self.auth_author)
         with self.assertRaises(IntegrityError):
             Follow.objects.create(user=self.auth_user, author=self.auth_author)
+
+
+class FollowBatchTest(TestCase):
+    def setUp(self) -> None:
+        self.authors = [User.objects.create(username=f'{AUTHOR}{i}')
+                        for i in range(3)]
+        self.auth_user = User.objects.create(username=AUTH_USER)
+        self.post = Post.objects.create(author=self.authors[0],
+                                        text=POST_TEXT)
+        self.pairs = [(self.auth_user.id, author.id)
+                      for author in self.authors]
+        cache.clear()
+
+    # TestCase не коммитит: on_commit выполняем сразу
+    @mock.patch.object(transaction, 'on_commit', lambda func: func())
+    def test_follow_graph_cache(self):
+        """The cached following set changes with every write path."""
+        user_id, author_ids = self.auth_user.id, [a.id for a in self.authors]
+        self.assertEqual(adjacency.following_ids(user_id), frozenset())
+
+        follows.follow(user_id, author_ids[0])
+        Follow.objects.create(user=self.auth_user, author=self.authors[1])
+        follows.follow_many(self.pairs)
+        with self.assertNumQueries(0):
+            self.assertEqual(adjacency.following_ids(user_id),
+                             frozenset(author_ids))
+
+        follows.unfollow(user_id, author_ids[0])
+        Follow.objects.filter(author=self.authors[1]).delete()
+        self.authors[2].delete()
+        with self.assertNumQueries(0):
+            self.assertFalse(adjacency.following_ids(user_id))
+
+    def test_stale_cache_never_skips_writes(self):
+        """Writes trust the database, a rolled back one the cache too."""
+        user_id, author_id = self.auth_user.id, self.authors[0].id
+        cache.set(adjacency.FOLLOWING_KEY.format(user_id),
+                  frozenset([author_id]))
+        self.assertTrue(follows.follow(user_id, author_id))
+        self.assertFalse(follows.follow(user_id, author_id))
+        self.assertTrue(Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists())
+
+        cache.clear()
+        adjacency.following_ids(user_id)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                follows.unfollow(user_id, author_id)
+                raise IntegrityError
+        self.assertTrue(adjacency.is_following(user_id, author_id))
+        self.assertTrue(follows.unfollow(user_id, author_id))
+        self.assertFalse(follows.unfollow(user_id, author_id))
+
+    def test_follow_many_in_batches(self):
+        """Batches create only the new follows and move the counters."""
+        Follow.objects.create(user=self.auth_user, author=self.authors[0])
+        created = follows.follow_many(self.pairs + self.pairs[:1],
+                                      batch_size=2)
+        self.assertEqual(created, 2)
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(counters.following(self.auth_user.id), 3)
+        self.assertEqual(counters.followers(self.authors[1].id), 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.auth_user, post=self.post).exists())
+
+        deleted = follows.unfollow_many(self.pairs[:2], batch_size=1)
+        self.assertEqual(deleted, 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(counters.following(self.auth_user.id), 1)
+        self.assertEqual(counters.followers(self.authors[0].id), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_self_follow_rejected_before_writes(self):
+        """A self follow anywhere in the batch writes nothing."""
+        with self.assertRaises(ValueError):
+            follows.follow_many(
+                self.pairs + [(self.auth_user.id, self.auth_user.id)])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_graph_command(self):
+        """follow_graph exports the graph and applies it back."""
+        follows.follow_many(self.pairs)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'follows.csv')
+            call_command('follow_graph', 'export', path)
+            call_command('follow_graph', 'unfollow', path, stdout=StringIO())
+            self.assertFalse(Follow.objects.exists())
+            out = StringIO()
+            call_command('follow_graph', 'follow', path, stdout=out)
+        self.assertIn('3 of 3 follow(s) changed', out.getvalue())
+        self.assertEqual(counters.following(self.auth_user.id), 3)
+
+
+class CounterModelTest(TestCase):
+    def setUp(self) -> None:
+        self.auth_author = User.objects.create(username=AUTHOR)
+        self.group = Group.objects.create(
+            title=GROUP_TITLE, description='Тестовое описание', slug=SLUG)
+        self.group_other = Group.objects.create(
+            title=GROUP_TITLE, description='Тестовое описание',
+            slug=f'{SLUG}-other')
+
+    def test_counters_follow_posts(self):
+        """Counters of the site, author and group move with posts."""
+        posts = [Post.objects.create(author=self.auth_author, text=POST_TEXT,
+                                     group=self.group) for _ in range(3)]
+        self.assertEqual(counters.total_posts(), 3)
+        self.assertEqual(counters.author_posts(self.auth_author.id), 3)
+        self.assertEqual(counters.group_posts(self.group.id), 3)
+
+        posts[0].delete()
+        posts[1].group = self.group_other
+        posts[1].save()
+        self.assertEqual(counters.total_posts(), 2)
+        self.assertEqual(counters.author_posts(self.auth_author.id), 2)
+        self.assertEqual(counters.group_posts(self.group.id), 1)
+        self.assertEqual(counters.group_posts(self.group_other.id), 1)
+
+    def test_counter_created_from_real_count(self):
+        """A missing counter row is recounted from the posts table."""
+        Post.objects.create(author=self.auth_author, text=POST_TEXT)
+        Counter.objects.all().delete()
+        self.assertEqual(counters.author_posts(self.auth_author.id), 1)
+        self.assertTrue(Counter.objects.filter(
+            scope=Counter.AUTHOR_POSTS,
+            object_id=self.auth_author.id).exists())
+
+    def test_bulk_create_moves_counters(self):
+        """bulk_create keeps the counters right without signals."""
+        Post.objects.bulk_create([
+            Post(author=self.auth_author, text=POST_TEXT, group=self.group)
+            for _ in range(4)
+        ])
+        self.assertEqual(counters.author_posts(self.auth_author.id), 4)
+        self.assertEqual(counters.group_posts(self.group.id), 4)
+
+    def test_bulk_create_refuses_ignore_conflicts(self):
+        """Skipped rows can not be counted, so ignore_conflicts fails."""
+        with self.assertRaises(ValueError):
+            Post.objects.bulk_create(
+                [Post(author=self.auth_author, text=POST_TEXT)],
+                ignore_conflicts=True)
+        self.assertFalse(Post.objects.exists())
+
+    def test_reconcile_counters_command(self):
+        """reconcile_counters fixes a counter that has drifted."""
+        Post.objects.create(author=self.auth_author, text=POST_TEXT)
+        Counter.objects.filter(scope=Counter.AUTHOR_POSTS).update(value=42)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn(f'{Counter.AUTHOR_POSTS}:{self.auth_author.id} 42 -> 1',
+                      out.getvalue())
+        self.assertEqual(counters.author_posts(self.auth_author.id), 1)
+
+    def test_counters_follow_subscriptions(self):
+        """Follower and following counters move with follows."""
+        auth_user = User.objects.create(username=AUTH_USER)
+        follow = Follow.objects.create(user=auth_user, author=self.auth_author)
+        self.assertEqual(counters.followers(self.auth_author.id), 1)
+        self.assertEqual(counters.following(auth_user.id), 1)
+
+        follow.delete()
+        self.assertEqual(counters.followers(self.auth_author.id), 0)
+        self.assertEqual(counters.following(auth_user.id), 0)
+
+        Follow.objects.create(user=auth_user, author=self.auth_author)
+        self.auth_author.delete()
+        self.assertEqual(counters.following(auth_user.id), 0)
@@ -0,0 +1,84 @@
+import base64
+import json
+from http import HTTPStatus
+
+from django.urls import reverse
+
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+from posts import timeline
+from posts.models import Post, User
+from posts.paginators import CursorPage, CursorPaginator
+from posts.views import FOLLOW_FEED_ORDERING
+
+
+AUTHOR = 'author'
+POST_TEXT = 'Пост для тестов'
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create(username=AUTHOR)
+        for i in range(1, 26):
+            Post.objects.create(author=cls.author, text=f'{POST_TEXT}, {i}')
+        cls.ordered = list(Post.objects.order_by('-pub_date', '-pk'))
+        cls.guest_client = BudgetClient()
+
+    def test_walks_forward_and_back(self):
+        """Next/prev tokens cover every post exactly once in both ways."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        walked = [post for page in pages for post in page]
+        self.assertEqual(walked, CursorPaginatorTest.ordered)
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_previous())
+
+    def test_walks_related_ordering(self):
+        """The follow feed pages by its timeline entries, not by posts."""
+        follower = User.objects.create(username='follower')
+        timeline.add_author(follower.pk, CursorPaginatorTest.author.pk)
+        feed = Post.objects.filter(timeline_entries__user=follower)
+        paginator = CursorPaginator(feed, 10, FOLLOW_FEED_ORDERING)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        walked = [post for page in pages for post in page]
+        self.assertEqual(walked, CursorPaginatorTest.ordered)
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+
+    def test_invalid_cursor_gives_first_page(self):
+        """A broken token falls back to the first page."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page('не-курсор')
+        self.assertEqual(list(page), CursorPaginatorTest.ordered[:10])
+
+    def test_cursor_with_bad_values_gives_first_page(self):
+        """A well-formed token with garbage values is no server error."""
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(['next', 'garbage', '1']).encode()).decode()
+        response = CursorPaginatorTest.guest_client.get(
+            reverse('posts:index') + f'?cursor={cursor}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(list(response.context['page_obj']),
+                         CursorPaginatorTest.ordered[:10])
+
+    def test_view_switches_to_cursor_mode(self):
+        """?cursor= on the index page renders a keyset page."""
+        response = CursorPaginatorTest.guest_client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+
+        response = CursorPaginatorTest.guest_client.get(
+            reverse('posts:index') + f'?cursor={next_cursor}')
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(list(page_obj), CursorPaginatorTest.ordered[10:20])
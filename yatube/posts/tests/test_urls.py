@@ -1,7 +1,7 @@
 from http import HTTPStatus
 
-from django.test import Client, TestCase
-
+from core.query_budget import BudgetClient
+from core.testing import TestCase
 from posts.models import Group, Post, User
 
 
@@ -38,10 +38,10 @@ class PostURLTest(TestCase):
                                          description='Тестовое описание',
                                          slug=SLUG)
         # три браузера: гость, залогинен, автор-поста-залогинен
-        cls.guest_client = Client()
-        cls.auth_client = Client()
+        cls.guest_client = BudgetClient()
+        cls.auth_client = BudgetClient()
         cls.auth_client.force_login(cls.auth_user)
-        cls.author_client = Client()
+        cls.author_client = BudgetClient()
         cls.author_client.force_login(cls.auth_author)
 
     def test_posts_urls_for_guest(self):
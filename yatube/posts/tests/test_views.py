@@ -2,15 +2,29 @@ import shutil
 import tempfile
 
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
+from core import db_routers
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+from posts import counters, derivatives, thumbnails
+from posts.caching import cache_anonymous
 from posts.forms import PostForm, CommentForm
-from posts.models import Group, Post, User, Follow
+from posts.models import Comment, Group, Post, User, Follow, TimelineEntry
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 
 POST_GROUP_TITLE = 'Тест групп'
@@ -68,7 +82,7 @@ class PostViewsTest(TestCase):
             cls.posts_auth_user.append(cls.post)
         cls.first_post_id = Post.objects.earliest('pub_date').id
 
-        cls.author_client = Client()
+        cls.author_client = BudgetClient()
         cls.author_client.force_login(cls.auth_author)
 
     @classmethod
@@ -250,10 +264,252 @@ class PostViewsTest(TestCase):
         self.assertEqual(response.context['post'].text, form_update['text'])
 
 
+# копии режем сразу, без потоков, переживающих тест
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.auth_author = User.objects.create(username=AUTHOR)
+        self.post = Post.objects.create(
+            author=self.auth_author,
+            text=POST_TEXT,
+            image=SimpleUploadedFile(
+                name=IMAGE_NAME, content=IMAGE_GIF, content_type='image/gif'),
+        )
+        self.guest_client = BudgetClient()
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Pages never resize images, they wait for the worker."""
+        url = reverse('posts:post_detail', kwargs={'id': self.post.id})
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'bg-light')
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.ready_thumbnail(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(url)
+        self.assertContains(response, thumbnail.url)
+
+    def test_list_page_prefetches_thumbnails(self):
+        """A list page resolves all thumbnails with one KV query."""
+        group = Group.objects.create(
+            title=POST_GROUP_TITLE, description='Тестовое описание',
+            slug=SLUG)
+        for i in range(5):
+            Post.objects.create(
+                author=self.auth_author, text=f'{POST_TEXT}, {i}',
+                group=group, image=self.post.image.name)
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'sl': SLUG})
+        # группа + счетчик + страница + одно чтение KV-хранилища sorl
+        with self.assertNumQueries(4):
+            response = self.guest_client.get(url)
+        thumbnail = thumbnails.ready_thumbnail(self.post.image)
+        self.assertContains(response, thumbnail.url, count=5)
+
+    def test_responsive_derivatives(self):
+        """Upload-time copies are cut per width, without metadata."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (700, 500), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        post = Post.objects.create(
+            author=self.auth_author, text=POST_TEXT,
+            image=SimpleUploadedFile(name='big.jpg',
+                                     content=buffer.getvalue(),
+                                     content_type='image/jpeg'))
+        derivatives.generate(post.id, post.image.name)
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, '320,640')
+
+        for width in (320, 640):
+            for extension in ('webp', 'jpg'):
+                name = derivatives.derivative_name(
+                    post.image.name, width, extension)
+                with default_storage.open(name) as copy:
+                    image = Image.open(copy)
+                    self.assertEqual(image.width, width)
+                    self.assertFalse(image.getexif())
+
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'id': post.id}))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '/640w.webp 640w')
+
+    def test_derivatives_unique_and_removed(self):
+        """Same stem never shares copies, deleted posts leave none."""
+        posts = []
+        for name, image_format in (('cat.jpg', 'JPEG'), ('cat.png', 'PNG')):
+            buffer = BytesIO()
+            Image.new('RGB', (400, 300), 'red').save(buffer, image_format)
+            posts.append(Post.objects.create(
+                author=self.auth_author, text=POST_TEXT,
+                image=SimpleUploadedFile(name=name,
+                                         content=buffer.getvalue())))
+        for post in posts:
+            derivatives.generate(post.id, post.image.name)
+        names = [derivatives.derivative_name(post.image.name, 320, 'jpg')
+                 for post in posts]
+        self.assertNotEqual(names[0], names[1])
+
+        # TestCase не коммитит: on_commit выполняем сразу
+        with mock.patch.object(transaction, 'on_commit',
+                               lambda func: func()):
+            posts[0].delete()
+            posts[1].image = self.post.image.name
+            posts[1].save()
+        self.assertFalse(default_storage.exists(names[0]))
+        self.assertFalse(default_storage.exists(names[1]))
+
+
+class PostListQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.auth_author = User.objects.create(
+            username=AUTHOR, first_name='Лев', last_name='Толстой')
+        cls.auth_user = User.objects.create(username=AUTH_USER)
+        cls.group = Group.objects.create(
+            title=POST_GROUP_TITLE,
+            description='Тестовое описание',
+            slug=SLUG,
+        )
+        for i in range(15):
+            Post.objects.create(author=cls.auth_author,
+                                text=f'{POST_TEXT}, {i}',
+                                group=cls.group)
+        Follow.objects.create(user=cls.auth_user, author=cls.auth_author)
+        cls.guest_client = BudgetClient()
+        cls.user_client = BudgetClient()
+        cls.user_client.force_login(cls.auth_user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_feed_joins_author_and_group(self):
+        """Post.objects.feed() needs no extra queries per post."""
+        with self.assertNumQueries(1):
+            for post in Post.objects.feed()[:10]:
+                post.author.get_full_name()
+                post.group.slug
+
+    def test_list_pages_query_count(self):
+        """List pages cost a constant number of queries, not one per post."""
+        url_queries = {
+            # COUNT + страница
+            reverse('posts:index'): 2,
+            # группа + COUNT + страница
+            reverse('posts:group_list', kwargs={'sl': SLUG}): 3,
+            # автор со счетчиками для ETag и шапки + страница
+            reverse('posts:profile', kwargs={'username': AUTHOR}): 2,
+        }
+        for url, queries in url_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    PostListQueriesTest.guest_client.get(url)
+
+    def test_paginators_use_counters(self):
+        """Paginated pages never run SELECT COUNT(*) over posts."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'sl': SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # первый запрос заводит счетчик, второй уже читает его
+                PostListQueriesTest.guest_client.get(url)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = PostListQueriesTest.guest_client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count, 15)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+    def test_profile_header_single_query(self):
+        """Counts come in one query, the follow state from the cache."""
+        url = reverse('posts:profile', kwargs={'username': AUTHOR})
+        # первый запрос кладет в кэш подписки читателя
+        PostListQueriesTest.user_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = PostListQueriesTest.user_client.get(url)
+        author = response.context['author']
+        self.assertEqual(
+            (author.posts_count, author.followers_count,
+             author.following_count), (15, 1, 0))
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'Подписчиков: 1')
+        header = [query for query in queries.captured_queries
+                  if 'posts_counter' in query['sql']
+                  or 'posts_follow' in query['sql']]
+        self.assertEqual(len(header), 1)
+
+    def test_post_detail_author_count(self):
+        """post_detail shows the author's post count without COUNT(*)."""
+        post = Post.objects.latest('pub_date')
+        with CaptureQueriesContext(connection) as queries:
+            response = PostListQueriesTest.guest_client.get(
+                reverse('posts:post_detail', kwargs={'id': post.id}))
+        self.assertEqual(response.context['count'], 15)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_post_detail_comments_paginated(self):
+        """post_detail renders one page of comments, JSON gives the rest."""
+        post = Post.objects.latest('pub_date')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=PostListQueriesTest.auth_user,
+                    text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ])
+        url = reverse('posts:post_detail', kwargs={'id': post.id})
+        # ETag (пост, счетчик автора), пост, страница комментариев
+        with self.assertNumQueries(4):
+            response = PostListQueriesTest.guest_client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+
+        response = PostListQueriesTest.guest_client.get(
+            reverse('posts:comments_batch', kwargs={'post_id': post.id}),
+            {'cursor': comments.next_cursor})
+        data = response.json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['comments'][0]['author'], AUTH_USER)
+
+    def test_follow_index_query_count(self):
+        """follow_index: session, user, COUNT and the page itself."""
+        url = reverse('posts:follow_index')
+        # подписки читателя читаются из базы только до первого кэширования
+        PostListQueriesTest.user_client.get(url)
+        with self.assertNumQueries(4):
+            PostListQueriesTest.user_client.get(url)
+
+    def test_follow_index_without_follows(self):
+        """A user following nobody gets an empty feed from one count."""
+        Follow.objects.all().delete()
+        url = reverse('posts:follow_index')
+        PostListQueriesTest.user_client.get(url)
+        # сессия, пользователь и пустая лента
+        with self.assertNumQueries(3):
+            response = PostListQueriesTest.user_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+
 class TestCache(TestCase):
     def setUp(self) -> None:
         self.auth_author = User.objects.create(username=AUTHOR)
-        self.guest_client = Client()
+        self.guest_client = BudgetClient()
         cache.clear()
 
     def test_cache_on_main_page(self):
@@ -267,16 +523,264 @@ class TestCache(TestCase):
         response_before = self.guest_client.get(reverse('posts:index'))
         self.assertContains(response_before, post_text)
 
-        # удаляем пост из БД - но кэш должен все еще вернуть удаленный пост
-        post.delete()
+        # правка в обход сигналов - кэш все еще отдает старый текст
+        Post.objects.filter(pk=post.pk).update(text=f'{POST_TEXT} новый')
         response_after = self.guest_client.get(reverse('posts:index'))
         self.assertContains(response_after, post_text)
 
-        # очистка кэша - удаленный еще раньше пост теперь и в кэше отсутствует
+        # очистка кэша - на странице уже новый текст
         cache.clear()
         response_cache_clear = self.guest_client.get(reverse('posts:index'))
         self.assertNotContains(response_cache_clear, post_text)
 
+    def test_cache_invalidated_by_signals(self):
+        """Deleting a post drops the cached index fragment at once."""
+        post_text = f'{POST_TEXT} кэш'
+        post = Post.objects.create(
+            author=self.auth_author, text=post_text)
+        response_before = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response_before, post_text)
+
+        post.delete()
+        response_after = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response_after, post_text)
+
+    def test_cache_varies_by_page(self):
+        """Every page of the index is cached under its own key."""
+        for i in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(
+                author=self.auth_author, text=f'{POST_TEXT}, {i}')
+        first_page = self.guest_client.get(reverse('posts:index'))
+        second_page = self.guest_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertContains(first_page, f'{POST_TEXT}, {POSTS_PER_PAGE}')
+        self.assertContains(second_page, f'{POST_TEXT}, 0')
+        self.assertNotContains(
+            second_page, f'{POST_TEXT}, {POSTS_PER_PAGE}')
+
+
+@override_settings(ANONYMOUS_CACHE_TIMEOUT=60)
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(username=AUTHOR)
+        self.post = Post.objects.create(author=self.author, text=POST_TEXT)
+        self.guest_client = BudgetClient()
+        self.user_client = BudgetClient()
+        self.user_client.force_login(self.author)
+        cache.clear()
+
+    def test_second_request_skips_orm(self):
+        """A cached page is served to guests without any query."""
+        url = reverse('posts:post_detail', kwargs={'id': self.post.id})
+        first = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_conditional_get(self):
+        """Matching If-None-Match or If-Modified-Since gives 304."""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        by_etag = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        by_date = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(by_etag.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(by_date.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(by_etag.content, b'')
+
+    def test_invalidated_by_signals(self):
+        """A new comment or post replaces the cached page."""
+        detail_url = reverse('posts:post_detail', kwargs={'id': self.post.id})
+        old = self.guest_client.get(detail_url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий')
+        new = self.guest_client.get(
+            detail_url, HTTP_IF_NONE_MATCH=old['ETag'])
+        self.assertEqual(new.status_code, HTTPStatus.OK)
+        self.assertContains(new, 'Новый комментарий')
+
+        profile_url = reverse('posts:profile', kwargs={'username': AUTHOR})
+        self.guest_client.get(profile_url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        self.assertContains(self.guest_client.get(profile_url), 'Свежий пост')
+
+    def test_invalidation_is_scoped(self):
+        """A change drops only the cached pages that showed it."""
+        other_author = User.objects.create(username=AUTH_USER)
+        other_post = Post.objects.create(author=other_author, text=POST_TEXT)
+        index_url = reverse('posts:index')
+        detail_url = reverse('posts:post_detail', kwargs={'id': self.post.id})
+        other_urls = (
+            index_url,
+            reverse('posts:post_detail', kwargs={'id': other_post.id}),
+            reverse('posts:profile', kwargs={'username': AUTH_USER}),
+        )
+        for url in (detail_url, *other_urls):
+            self.guest_client.get(url)
+
+        Comment.objects.create(
+            post=self.post, author=other_author, text='Новый комментарий')
+        for url in other_urls:
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.guest_client.get(url)
+        self.assertContains(self.guest_client.get(detail_url),
+                            'Новый комментарий')
+
+        # автор комментария переименовался - страница поста устарела
+        other_author.first_name = 'Лев'
+        other_author.save()
+        self.assertContains(self.guest_client.get(detail_url), 'Лев')
+
+        group = Group.objects.create(title=POST_GROUP_TITLE, slug=SLUG)
+        self.post.group = group
+        self.post.save()
+        self.guest_client.get(index_url)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.guest_client.get(index_url),
+                            'Новое название')
+
+    def test_filled_from_primary(self):
+        """A cache miss renders from the primary, never from a replica."""
+        pinned = []
+
+        @cache_anonymous
+        def view(request):
+            pinned.append(db_routers.is_pinned())
+            return HttpResponse(POST_TEXT)
+
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        # записи из setUp не в счет: запрос начинается с чистого листа
+        db_routers.reset()
+        view(request)
+        self.assertEqual(pinned, [True])
+
+    def test_varies_by_query_string(self):
+        """Each query string is cached under its own key."""
+        group = Group.objects.create(title=POST_GROUP_TITLE, slug=SLUG)
+        for i in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(
+                author=self.author, group=group, text=f'{POST_TEXT}, {i}')
+        url = reverse('posts:group_list', kwargs={'sl': SLUG})
+        first_page = self.guest_client.get(url)
+        second_page = self.guest_client.get(url + '?page=2')
+        self.assertNotEqual(first_page['ETag'], second_page['ETag'])
+        self.assertContains(second_page, f'{POST_TEXT}, 0')
+
+    def test_authenticated_users_bypass_cache(self):
+        """Logged in users always get a freshly rendered page."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.user_client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNotNone(response.context)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(username=AUTHOR)
+        self.user = User.objects.create(username=AUTH_USER)
+        self.post = Post.objects.create(author=self.author, text=POST_TEXT)
+        self.user_client = BudgetClient()
+        self.user_client.force_login(self.user)
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'id': self.post.id})
+        # CSRF-cookie входит в ETag: получаем ее заранее, как браузер
+        self.user_client.get(self.detail_url)
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': AUTHOR})
+
+    def revalidate(self, url, response):
+        return self.user_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_give_304(self):
+        """Post and profile pages answer 304 while nothing changed."""
+        for url in (self.detail_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.user_client.get(url)
+                self.assertEqual(
+                    self.revalidate(url, response).status_code,
+                    HTTPStatus.NOT_MODIFIED)
+
+    def test_comments_change_post_validators(self):
+        """Adding or deleting a comment gives a fresh post page."""
+        response = self.user_client.get(self.detail_url)
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        response_added = self.revalidate(self.detail_url, response)
+        self.assertEqual(response_added.status_code, HTTPStatus.OK)
+
+        comment.delete()
+        response_deleted = self.revalidate(self.detail_url, response_added)
+        self.assertEqual(response_deleted.status_code, HTTPStatus.OK)
+
+    def test_post_edit_changes_validators(self):
+        """Editing or adding posts gives fresh post and profile pages."""
+        detail = self.user_client.get(self.detail_url)
+        profile = self.user_client.get(self.profile_url)
+        self.post.text = f'{POST_TEXT} правка'
+        self.post.save()
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code,
+                         HTTPStatus.OK)
+        self.assertEqual(
+            self.revalidate(self.profile_url, profile).status_code,
+            HTTPStatus.OK)
+
+    def test_no_last_modified(self):
+        """Follows leave no timestamp, so pages send only an ETag."""
+        for url in (self.detail_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.user_client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_renames_change_post_validators(self):
+        """The author and group names on the post page are in its ETag."""
+        group = Group.objects.create(title=POST_GROUP_TITLE, slug=SLUG)
+        self.post.group = group
+        self.post.save()
+        response = self.user_client.get(self.detail_url)
+        Group.objects.filter(pk=group.pk).update(title='Новое название')
+        response = self.revalidate(self.detail_url, response)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        User.objects.filter(pk=self.author.pk).update(first_name='Лев')
+        self.assertEqual(
+            self.revalidate(self.detail_url, response).status_code,
+            HTTPStatus.OK)
+
+    def test_group_renames_change_profile_validators(self):
+        """The titles and slugs of groups on the profile are in its ETag."""
+        group = Group.objects.create(title=POST_GROUP_TITLE, slug=SLUG)
+        self.post.group = group
+        self.post.save()
+        response = self.user_client.get(self.profile_url)
+        group.title = 'Новое название'
+        group.save()
+        response = self.revalidate(self.profile_url, response)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        group.slug = f'{SLUG}-new'
+        group.save()
+        self.assertEqual(
+            self.revalidate(self.profile_url, response).status_code,
+            HTTPStatus.OK)
+
+    def test_etag_depends_on_viewer(self):
+        """Another user never gets 304 for a page rendered for someone."""
+        response = self.user_client.get(self.profile_url)
+        author_client = BudgetClient()
+        author_client.force_login(self.author)
+        response_author = author_client.get(
+            self.profile_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_author.status_code, HTTPStatus.OK)
+
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            self.revalidate(self.profile_url, response).status_code,
+            HTTPStatus.OK)
+
 
 class TestFollow(TestCase):
     def setUp(self) -> None:
@@ -293,7 +797,7 @@ class TestFollow(TestCase):
         self.wrong_author_post = Post.objects.create(
             author=self.auth_wrong_author, text=f'wrong {POST_TEXT}')
         # браузер
-        self.user_client = Client()
+        self.user_client = BudgetClient()
         self.user_client.force_login(self.auth_user)
 
         cache.clear()
@@ -359,3 +863,119 @@ class TestFollow(TestCase):
         )
         self.assertIn(self.author_post, response.context['page_obj'])
         self.assertIn(self.wrong_author_post, response.context['page_obj'])
+
+    def test_follow_timeline_fan_out(self):
+        """Timeline rows follow new posts and the follow graph changes."""
+        Follow.objects.create(user=self.auth_user, author=self.auth_author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.auth_user, post=self.author_post).exists())
+
+        new_post = Post.objects.create(
+            author=self.auth_author, text=f'{POST_TEXT}, новый')
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+        Follow.objects.filter(
+            user=self.auth_user, author=self.auth_author).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.auth_user).exists())
+
+    def test_follow_is_idempotent(self):
+        """Repeated follow and unfollow clicks change nothing twice."""
+        follow_url = reverse('posts:profile_follow',
+                             kwargs={'username': AUTHOR})
+        unfollow_url = reverse('posts:profile_unfollow',
+                               kwargs={'username': AUTHOR})
+        for _ in range(2):
+            self.user_client.get(follow_url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(counters.followers(self.auth_author.id), 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.auth_user, post=self.author_post).exists())
+
+        for _ in range(2):
+            self.user_client.get(unfollow_url)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(counters.followers(self.auth_author.id), 0)
+        self.assertEqual(counters.following(self.auth_user.id), 0)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.auth_user).exists())
+
+    def test_follow_ajax_returns_followers(self):
+        """AJAX follow and unfollow answer with the new follower count."""
+        response = self.user_client.get(
+            reverse('posts:profile_follow', kwargs={'username': AUTHOR}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(),
+                         {'following': True, 'followers': 1})
+        response = self.user_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': AUTHOR}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(),
+                         {'following': False, 'followers': 0})
+
+    def test_follow_self_and_unknown_author(self):
+        """Self follow is a no-op, an unknown author is 404."""
+        self.user_client.get(reverse('posts:profile_follow',
+                                     kwargs={'username': AUTH_USER}))
+        self.assertFalse(Follow.objects.exists())
+        response = self.user_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.auth_author = User.objects.create(username=AUTHOR)
+        cls.post_cat = Post.objects.create(
+            author=cls.auth_author, text='Кошка спит на солнце')
+        cls.post_cats = Post.objects.create(
+            author=cls.auth_author, text='Кошка и еще раз кошка')
+        cls.post_dog = Post.objects.create(
+            author=cls.auth_author, text='Собака гуляет')
+        for i in range(POSTS_PER_PAGE + 2):
+            Post.objects.create(author=cls.auth_author, text=f'Гуляет {i}')
+        cls.guest_client = BudgetClient()
+
+    def search(self, query, **params):
+        return SearchViewTest.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def test_search_is_ranked(self):
+        """Posts with more matches come first, others are not found."""
+        page_obj = self.search('кошка').context['page_obj']
+        self.assertEqual(list(page_obj),
+                         [SearchViewTest.post_cats, SearchViewTest.post_cat])
+
+    def test_search_is_paginated(self):
+        """Results are paged and page links keep the query."""
+        response = self.search('гуляет')
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         POSTS_PER_PAGE + 3)
+        self.assertContains(response, '?q=%D0%B3%D1%83%D0%BB%D1%8F%D0%B5%D1'
+                                      '%82&amp;page=2')
+        response = self.search('гуляет', page=2)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Signals keep the index in line with the posts."""
+        post = SearchViewTest.post_dog
+        post.text = 'Попугай'
+        post.save()
+        self.assertEqual(list(self.search('попугай').context['page_obj']),
+                         [post])
+        self.assertNotIn(post, self.search('собака').context['page_obj'])
+        post.delete()
+        self.assertEqual(len(self.search('попугай').context['page_obj']), 0)
+
+    def test_admin_search_uses_index(self):
+        """The admin changelist finds posts through the same index."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        client = BudgetClient()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошка'})
+        self.assertEqual(response.context['cl'].result_count, 2)
@@ -0,0 +1,143 @@
+"""Background generation of post thumbnails.
+
+Web requests never decode or resize images: a post with a new image
+schedules its thumbnail on a small thread pool once the transaction is
+committed, templates only look the finished thumbnail up in sorl's
+key-value store and show a placeholder until it is there.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .caching import bump_feed_version, bump_post_pages
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+POST_GEOMETRY = '960x339'
+POST_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def thumbnail_file(image, geometry=POST_GEOMETRY, **options):
+    """Returns the ImageFile sorl stores the thumbnail under, without I/O.
+
+    Mirrors the option handling of ThumbnailBackend.get_thumbnail, so the
+    name matches the one the worker generates.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = {**POST_OPTIONS, **options}
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(image):
+    """Returns the generated post thumbnail or None if it is not ready."""
+    if not image:
+        return None
+    return default.kvstore.get(thumbnail_file(image))
+
+
+def prefetch_thumbnails(posts):
+    """Looks the thumbnails of a whole page of posts up at once.
+
+    Every post gets a prefetched_thumbnail attribute (None if not ready).
+    With the default cached_db key-value store that is one cache
+    get_many plus at most one DB query for the cache misses.
+    """
+    # у постов с готовыми адаптивными копиями превью не нужно
+    posts = [post for post in posts
+             if post.image and not post.image_widths]
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        for post in posts:
+            post.prefetched_thumbnail = ready_thumbnail(post.image)
+        return
+
+    keys = {post: add_prefix(thumbnail_file(post.image).key)
+            for post in posts}
+    values = kvstore.cache.get_many(set(keys.values()))
+    missing = set(keys.values()) - set(values)
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        values.update(found)
+        # как и сам sorl, запоминаем отсутствие записи, чтобы не ходить в БД
+        kvstore.cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+    for post, key in keys.items():
+        value = values.get(key)
+        post.prefetched_thumbnail = (
+            None if value is None or value == EMPTY_VALUE
+            else deserialize_image_file(value))
+
+
+def generate(name):
+    """Generates the post thumbnail of the image file name right away."""
+    get_thumbnail(name, POST_GEOMETRY, **POST_OPTIONS)
+    # в закэшированных лентах вместо превью пока заглушка
+    bump_feed_version()
+    bump_post_pages(Post.objects.filter(image=name))
+
+
+def _run(key, func, args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background image job %s failed', key)
+    finally:
+        with _lock:
+            _pending.discard(key)
+        close_old_connections()
+
+
+def submit(key, func, *args):
+    """Runs func(*args) on the image workers, once per key at a time."""
+    global _executor
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+        if settings.THUMBNAIL_WORKERS and _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    if not settings.THUMBNAIL_WORKERS:
+        # THUMBNAIL_WORKERS = 0: генерируем сразу, например в shell
+        _run(key, func, args)
+    else:
+        _executor.submit(_run, key, func, args)
+
+
+def schedule(image):
+    """Queues the thumbnail of the image after the current commit."""
+    if image:
+        name = image.name
+        transaction.on_commit(
+            lambda: submit(f'thumbnail:{name}', generate, name))
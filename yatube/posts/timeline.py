@@ -0,0 +1,73 @@
+"""Fan-out-on-write follow feed.
+
+Every follower gets a TimelineEntry row when a post is published, so
+follow_index reads one indexed range of its own rows instead of joining
+the whole follow graph with the posts table on every hit.
+"""
+from django.db import transaction
+
+from .models import Follow, Post, TimelineEntry
+
+
+def fan_out_post(post):
+    """Puts a freshly created post into the timelines of its followers."""
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    """Backfills the user's timeline with all posts of a followed author."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts.iterator()],
+        ignore_conflicts=True,
+    )
+
+
+def add_follows(pairs):
+    """add_author() for a batch of (user_id, author_id) in one read."""
+    followers = {}
+    for user_id, author_id in pairs:
+        followers.setdefault(author_id, []).append(user_id)
+    posts = Post.objects.filter(author_id__in=followers).values_list(
+        'author_id', 'id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for author_id, post_id, pub_date in posts.iterator()
+         for user_id in followers[author_id]],
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    """Drops the posts of an unfollowed author from the user's timeline."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def remove_follows(pairs):
+    """remove_author() for a batch, one DELETE per user."""
+    authors = {}
+    for user_id, author_id in pairs:
+        authors.setdefault(user_id, []).append(author_id)
+    for user_id, author_ids in authors.items():
+        TimelineEntry.objects.filter(
+            user_id=user_id, post__author_id__in=author_ids).delete()
+
+
+@transaction.atomic
+def rebuild_timeline(user_id):
+    """Recreates the user's timeline from the current follow graph."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(
+        user_id=user_id, author__isnull=False).values_list(
+            'author_id', flat=True)
+    for author_id in author_ids:
+        add_author(user_id, author_id)
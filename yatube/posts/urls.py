@@ -11,6 +11,10 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.comments_batch, name='comments_batch'),
+
+    path('search/', views.search, name='search'),
 
     path('follow/',
          views.follow_index, name='follow_index'),
@@ -1,20 +1,42 @@
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+from core.db_routers import primary_db
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from yatube.settings import POSTS_PER_PAGE
+from django.views.decorators.http import condition
+from yatube.settings import (COMMENTS_PER_PAGE, FEED_CACHE_TIMEOUT,
+                             POSTS_PER_PAGE)
 
+from . import conditional, counters, follows
+from . import comments as post_comments, search as post_search
+from .caching import (SITE, cache_anonymous, depends_on, depends_on_posts,
+                      get_feed_version)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Group, Post, User
+from .paginators import DEFAULT_ORDERING, CountedPaginator, CursorPaginator
+
+# лента подписок идет в порядке записей ленты, а не постов
+FOLLOW_FEED_ORDERING = ('-timeline_entries__pub_date', '-timeline_entries__id')
 
 
+@cache_anonymous
 def index(request):
     """Provides rendering the main page."""
     title = 'Последние обновления на сайте'
-    post_list = Post.objects.all()
-    page_obj = get_paginator_page_obj(request, post_list, POSTS_PER_PAGE)
-    context = {'title': title, 'page_obj': page_obj, 'index_nav_button': True}
+    depends_on(request, SITE)
+    post_list = Post.objects.feed()
+    page_obj = get_paginator_page_obj(
+        request, post_list, POSTS_PER_PAGE, cursor=True,
+        count=counters.total_posts)
+    depends_on_posts(request, page_obj)
+    context = {'title': title, 'page_obj': page_obj, 'index_nav_button': True,
+               'feed_version': get_feed_version(),
+               'feed_cache_timeout': FEED_CACHE_TIMEOUT}
     return render(request, 'posts/index.html', context)
 
 
@@ -23,49 +45,102 @@ def group(request):
     return HttpResponse('There will be a list of groups')
 
 
+@cache_anonymous
 def group_posts(request, sl):
     """Provides rendering group pages."""
     group = get_object_or_404(Group, slug=sl)
+    depends_on(request, f'group:{group.id}')
     posts = group.posts.all()[:10]
-    post_list = group.posts.all()
-    page_obj = get_paginator_page_obj(request, post_list, POSTS_PER_PAGE)
+    post_list = group.posts.feed()
+    page_obj = get_paginator_page_obj(
+        request, post_list, POSTS_PER_PAGE, cursor=True,
+        count=partial(counters.group_posts, group.id))
+    depends_on_posts(request, page_obj)
     title = f'Записи сообщества {group}'
     context = {'group': group,
                'posts': posts, 'title': title, 'page_obj': page_obj}
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
     """Provides rendering profile pages."""
-    author = get_object_or_404(User, username=username)
-    can_follow, following = False, False
-
-    if request.user.is_authenticated:
-        user = get_object_or_404(User, username=request.user)
-        if author.id != user.id:
-            can_follow = True
-        if Follow.objects.filter(author=author.id, user=user.id).exists():
-            following = True
-
-    post_list = Post.objects.filter(author_id=author.id)
-    page_obj = get_paginator_page_obj(request, post_list, POSTS_PER_PAGE)
+    author = conditional.profile_author(request, username)
+    depends_on(request, f'author:{author.pk}')
+    can_follow = (request.user.is_authenticated
+                  and author.pk != request.user.pk)
+
+    post_list = Post.objects.feed().filter(author_id=author.id)
+    page_obj = get_paginator_page_obj(
+        request, post_list, POSTS_PER_PAGE, cursor=True,
+        count=lambda: author.posts_count)
+    depends_on_posts(request, page_obj)
     context = {'author': author, 'page_obj': page_obj,
-               'following': following, 'can_follow': can_follow}
+               'following': author.is_followed, 'can_follow': can_follow}
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous
+@condition(etag_func=conditional.post_etag)
 def post_detail(request, id):
     """Provides rendering post detail pages with comments."""
-    post = Post.objects.get(pk=id)
+    depends_on(request, f'post:{id}')
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=id)
+    depends_on_posts(request, [post])
+    comments = get_comments_page(post.id, request.GET.get('comments'))
+    # имена авторов комментариев
+    depends_on(request, *{f'author:{comment.author_id}'
+                          for comment in comments})
     comment_form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'comment_form': comment_form,
+        'count': conditional.post_author_posts(request, post.author_id),
+        'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_batch(request, post_id):
+    """Returns the next batch of comments as JSON for "load more"."""
+    get_object_or_404(Post.objects.only('id'), pk=post_id)
+    page = get_comments_page(post_id, request.GET.get('cursor'))
+    comments = [
+        {
+            'id': comment.id,
+            'author': comment.author.username,
+            'author_name': comment.author.get_full_name(),
+            'author_url': reverse('posts:profile',
+                                  kwargs={'username': comment.author}),
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+        }
+        for comment in page
+    ]
+    return JsonResponse(
+        {'comments': comments, 'next_cursor': page.next_cursor})
+
+
+def search(request):
+    """Provides rendering ranked full-text search results."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        results = post_search.get_backend().search(query)
+        page_obj = get_paginator_page_obj(request, results, POSTS_PER_PAGE)
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+        'paginator_params': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@primary_db
 def post_create(request):
     """Provides rendering post creating page."""
     title = 'Новый пост'
@@ -84,6 +159,7 @@ def post_create(request):
 
 
 @login_required
+@primary_db
 def post_edit(request, id):
     """Provides rendering post editing page."""
     title = 'Редактируем пост'
@@ -107,15 +183,21 @@ def post_edit(request, id):
 
 
 @login_required
+@primary_db
 def add_comment(request, post_id):
     """Provides rendering comment creating page."""
-    post = Post.objects.get(pk=post_id)
+    if request.method == 'POST' and post_comments.rate_limited(
+            request.user.pk):
+        return HttpResponse('Слишком много комментариев, попробуйте позже.',
+                            status=HTTPStatus.TOO_MANY_REQUESTS)
+    if not post_comments.post_exists(post_id):
+        raise Http404('Пост не найден')
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = post
-        comment.save()
+        comment.post_id = post_id
+        post_comments.add(comment)
     return redirect('posts:post_detail', id=post_id)
 
 
@@ -123,42 +205,87 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Provides rendering the main page with subscribed authors."""
     title = 'Последние обновления ленты подписок.'
-    user = request.user
-    following_authors = Follow.objects.filter(user__pk=user.pk)
-    following_authors = [following.author for following in following_authors]
-    post_list = Post.objects.filter(author__in=following_authors)
-    page_obj = get_paginator_page_obj(request, post_list, POSTS_PER_PAGE)
-    context = {'title': title, 'page_obj': page_obj, 'follow_nav_button': True}
+    post_list = Post.objects.feed().filter(
+        timeline_entries__user=request.user,
+    ).order_by(*FOLLOW_FEED_ORDERING)
+    page_obj = get_paginator_page_obj(
+        request, post_list, POSTS_PER_PAGE, cursor=True,
+        ordering=FOLLOW_FEED_ORDERING)
+    context = {'title': title, 'page_obj': page_obj, 'follow_nav_button': True,
+               'feed_version': get_feed_version(),
+               'feed_cache_timeout': FEED_CACHE_TIMEOUT}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@primary_db
 def profile_follow(request, username):
     """Makes subscription on the chosen author."""
-    author = User.objects.get(username=username)
-    user = User.objects.get(username=request.user)
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username)
     # дважды не подпишешься \ сам на себя не подпишешься
-    if (Follow.objects.filter(author=author.id, user=user.id).exists()
-            or author.id == user.id):
-        return redirect(
-            to=reverse('posts:profile', kwargs={'username': username}),)
-    Follow.objects.create(author=author, user=user)
-    return redirect(to=reverse('posts:profile', kwargs={'username': username}))
+    follows.follow(request.user.pk, author_id)
+    return get_follow_response(
+        request, username, author_id, author_id != request.user.pk)
 
 
 @login_required
+@primary_db
 def profile_unfollow(request, username):
     """Deletes subscription on the chosen author."""
-    author = User.objects.get(username=username)
-    user = User.objects.get(username=request.user)
-    instance = Follow.objects.filter(author__id=author.id, user__id=user.id)
-    instance.delete()
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username)
+    follows.unfollow(request.user.pk, author_id)
+    return get_follow_response(request, username, author_id, False)
+
+
+def get_follow_response(request, username, author_id, following):
+    """AJAX gets the new follow state as JSON, the rest the profile."""
+    if request.is_ajax():
+        return JsonResponse({'following': following,
+                             'followers': counters.followers(author_id)})
     return redirect(to=reverse('posts:profile', kwargs={'username': username}))
 
 
-def get_paginator_page_obj(request, all_obj, obj_per_page):
-    """Takes a list of objects, returns a paged list of objects."""
-    paginator = Paginator(all_obj, obj_per_page)
+def get_comments_page(post_id, cursor=None):
+    """Returns a keyset page of the post comments, authors joined in."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=('-created', '-pk'))
+    return paginator.get_page(cursor)
+
+
+def get_paginator_page_obj(request, all_obj, obj_per_page,
+                           cursor=False, count=None,
+                           ordering=DEFAULT_ORDERING):
+    """Takes a list of objects, returns a paged list of objects.
+
+    Views passing cursor=True switch to keyset pagination as soon as the
+    request carries a ?cursor= token, numbered pages keep working as before.
+    ordering is the keyset of the cursor pages, it must match the order of
+    all_obj. count is an optional callable returning the total (see
+    posts.counters), without it the paginator runs SELECT COUNT(*).
+    """
+    if cursor:
+        cursor_paginator = CursorPaginator(all_obj, obj_per_page, ordering)
+        token = request.GET.get('cursor')
+        if token:
+            return cursor_paginator.get_page(token)
+        # ключ курсора по связанной модели приходит аннотацией; считаем
+        # без нее, иначе COUNT(*) обернется в подзапрос с GROUP BY
+        if count is None:
+            count = all_obj.count
+        all_obj = cursor_paginator.object_list
+
+    if count is None:
+        paginator = Paginator(all_obj, obj_per_page)
+    else:
+        paginator = CountedPaginator(all_obj, obj_per_page, count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    if cursor and page_obj.has_next():
+        # ссылка "Следующая" уходит в keyset-режим, без OFFSET
+        page_obj.next_cursor = cursor_paginator.encode_cursor(
+            page_obj[-1], 'next')
     return page_obj
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
 from django.urls.base import reverse, reverse_lazy
 
+from core.query_budget import BudgetClient
+from core.testing import TestCase
+
 from .forms import CreationForm
 
 User = get_user_model()
@@ -9,7 +11,7 @@ User = get_user_model()
 
 class TestUserForm(TestCase):
     def setUp(self):
-        self.client = Client()
+        self.client = BudgetClient()
         self.form = CreationForm()
 
     def test_user_signup_form(self):
@@ -3,6 +3,7 @@ Django settings for yatube project.
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,7 +41,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,13 +86,37 @@ INTERNAL_IPS = [
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# постоянные соединения: сколько секунд жить, 0 - закрывать после запроса
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+# проверять сохраненное соединение перед каждым запросом
+DB_HEALTH_CHECKS = True
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Реплики только для чтения: DB_REPLICAS=replica1,replica2.
+# Локально это SQLite-копии основной базы рядом с ней (db.replica1.sqlite3),
+# в тестах они смотрят в тестовую основную базу.
+DATABASE_REPLICAS = [
+    alias for alias in os.environ.get('DB_REPLICAS', '').split(',') if alias
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# сколько секунд после записи пользователь читает с основной базы
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'use_primary_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,16 +164,66 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 EMPTY_VALUE = '-пусто-'
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# потоки для фоновой нарезки превью, 0 - резать сразу после коммита
+THUMBNAIL_WORKERS = 2
+# ширины адаптивных копий картинок постов (WebP + JPEG)
+POST_IMAGE_WIDTHS = (320, 640, 960)
+# фрагменты ленты инвалидируются сигналами, поэтому живут минутами
+FEED_CACHE_TIMEOUT = 60 * 5
+# целые страницы для гостей, 0 - не кэшировать
+ANONYMOUS_CACHE_TIMEOUT = 60 * 5
+# множества подписок обновляются на месте, срок - страховка от гонок
+FOLLOWING_CACHE_TIMEOUT = 60 * 60
+# не больше COMMENT_RATE_LIMIT комментариев за COMMENT_RATE_WINDOW секунд;
+# точно - только с атомарным incr (Memcached, Redis), FileBasedCache
+# под нагрузкой пропускает лишнее
+COMMENT_RATE_LIMIT = 10
+COMMENT_RATE_WINDOW = 60
+# пачки комментариев: 0 - сохранять сразу. Буфер живет в памяти процесса:
+# комментарии появляются с задержкой, получают время сброса пачки и
+# теряются, если процесс убит до сброса, поэтому по умолчанию выключено.
+# Без фонового сброса (COMMENT_FLUSH_SECONDS = 0) пачку пишет запрос,
+# который ее заполнил
+COMMENT_BATCH_SIZE = 0
+COMMENT_FLUSH_SECONDS = 2
+# профилирование запросов: медленные и тяжелые запросы пишутся в лог
+PROFILING_ENABLED = True
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_MAX_QUERIES = 30
+# сколько последних запросов каждого url хранить для перцентилей
+PROFILING_SAMPLES = 1000
+# адреса, которым мониторинг виден без входа под staff; пусто - только staff
+MONITORING_ALLOWED_IPS = []
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-# Такое кэширование годится для разработки,
-# а на боевом сервере обычно используют Memcached или Redis.
+# Двухуровневый кэш: L1 - небольшой LRU в памяти процесса, L2 - общий
+# для всех воркеров. Файлы годятся для одного сервера, в бою L2 меняют
+# на Memcached или Redis через CACHE_L2_BACKEND и CACHE_L2_LOCATION.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            # версии и счетчики всегда читаются из L2: их бамп в одном
+            # процессе сразу видят остальные
+            'L1_EXCLUDE': ('posts:feed_version', 'posts:page_version',
+                           'posts:count:', 'posts:following:',
+                           'posts:comment_rate:'),
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get(
+            'CACHE_L2_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'CACHE_L2_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'yatube_cache')),
+    },
 }
 
 #  подключаем движок filebased.EmailBackend